@@ -0,0 +1,27 @@
+#ifndef KNOB_MATCHERS_H
+#define KNOB_MATCHERS_H
+
+#include "clang/ASTMatchers/ASTMatchers.h"
+
+using namespace clang;
+using namespace clang::ast_matchers;
+
+static const DeclarationMatcher GlobalConstKnobMatcher =
+    varDecl(hasType(isConstQualified()), hasGlobalStorage(),
+            hasInitializer(ignoringImpCasts(integerLiteral())))
+        .bind("knobVar");
+
+static const DeclarationMatcher ConstructorWithFunctionInitMatcher =
+    varDecl(
+        has(exprWithCleanups(has(cxxConstructExpr(has(materializeTemporaryExpr(
+            has(implicitCastExpr(has(callExpr(callee(functionDecl(
+                hasName("init"),
+                hasDeclContext(namespaceDecl(hasName("cl"))))))))))))))))
+        .bind("knobVar");
+
+static const DeclarationMatcher EnumConstantMatcher =
+    enumConstantDecl(
+        has(implicitCastExpr(has(constantExpr(has(integerLiteral()))))))
+        .bind("enumConst");
+
+#endif
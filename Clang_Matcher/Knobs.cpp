@@ -1,9 +1,14 @@
+#include "KnobMatchers.h"
+#include "clang/AST/ExprCXX.h"
 #include "clang/ASTMatchers/ASTMatchFinder.h"
 #include "clang/ASTMatchers/ASTMatchers.h"
 #include "clang/Frontend/FrontendActions.h"
+#include "clang/Lex/Lexer.h"
 #include "clang/Tooling/CommonOptionsParser.h"
 #include "clang/Tooling/Tooling.h"
 #include "llvm/Support/CommandLine.h"
+#include "llvm/Support/JSON.h"
+#include <optional>
 
 using namespace clang::tooling;
 using namespace llvm;
@@ -15,23 +20,97 @@ static cl::OptionCategory MyToolCategory("my-tool options");
 static cl::extrahelp CommonHelp(CommonOptionsParser::HelpMessage);
 static cl::extrahelp MoreHelp("\nMore help text...\n");
 
-DeclarationMatcher GlobalConstKnobMatcher =
-    varDecl(hasType(isConstQualified()), hasGlobalStorage(),
-            hasInitializer(ignoringImpCasts(integerLiteral())))
-        .bind("knobVar");
+// One knob of the inventory, printed as one line of JSON
+// Identifier, description and hidden only exist for cl::opt knobs
+struct KnobRecord {
+  std::string File;
+  unsigned Line = 0;
+  unsigned Column = 0;
+  std::string Name;
+  std::string Type;
+  std::optional<std::string> Identifier;
+  std::optional<std::string> Init;
+  std::optional<std::string> Desc;
+  bool Hidden = false;
+};
+
+static void attributeOrNull(json::OStream &J, StringRef Key,
+                            const std::optional<std::string> &Value) {
+  if (Value)
+    J.attribute(Key, *Value);
+  else
+    J.attribute(Key, nullptr);
+}
 
-DeclarationMatcher ConstructorWithFunctionInitMatcher =
-    varDecl(
-        has(exprWithCleanups(has(cxxConstructExpr(has(materializeTemporaryExpr(
-            has(implicitCastExpr(has(callExpr(callee(functionDecl(
-                hasName("init"),
-                hasDeclContext(namespaceDecl(hasName("cl"))))))))))))))))
-        .bind("knobVar");
+static void printKnobRecord(const KnobRecord &Record) {
+  json::OStream J(outs());
+  J.object([&] {
+    J.attribute("file", Record.File);
+    J.attribute("line", Record.Line);
+    J.attribute("column", Record.Column);
+    J.attribute("name", Record.Name);
+    J.attribute("type", Record.Type);
+    attributeOrNull(J, "identifier", Record.Identifier);
+    attributeOrNull(J, "init", Record.Init);
+    attributeOrNull(J, "desc", Record.Desc);
+    J.attribute("hidden", Record.Hidden);
+  });
+  outs() << "\n";
+}
+
+static KnobRecord recordAt(const NamedDecl *D, QualType Type,
+                           const SourceManager &SM) {
+  PresumedLoc Loc = SM.getPresumedLoc(D->getLocation());
+  KnobRecord Record;
+  Record.File = Loc.getFilename();
+  Record.Line = Loc.getLine();
+  Record.Column = Loc.getColumn();
+  Record.Name = D->getNameAsString();
+  Record.Type = Type.getAsString();
+  return Record;
+}
 
-DeclarationMatcher EnumConstantMatcher =
-    enumConstantDecl(
-        has(implicitCastExpr(has(constantExpr(has(integerLiteral()))))))
-        .bind("enumConst");
+static std::string sourceText(const Expr *E, ASTContext &Context) {
+  return Lexer::getSourceText(
+             CharSourceRange::getTokenRange(E->getSourceRange()),
+             Context.getSourceManager(), Context.getLangOpts())
+      .str();
+}
+
+// Fills in the identifier, cl::init, cl::desc and cl::Hidden from the
+// arguments of a cl::opt constructor, eg.
+// cl::opt<unsigned> X("x", cl::Hidden, cl::init(5), cl::desc("..."))
+static void readOptArguments(const CXXConstructExpr *Construct,
+                             ASTContext &Context, KnobRecord &Record) {
+  for (const Expr *Arg : Construct->arguments()) {
+    Arg = Arg->IgnoreImplicit();
+    if (const auto *Cast = dyn_cast<CXXFunctionalCastExpr>(Arg))
+      Arg = Cast->getSubExpr()->IgnoreImplicit();
+
+    if (const auto *Literal = dyn_cast<StringLiteral>(Arg)) {
+      if (!Record.Identifier)
+        Record.Identifier = Literal->getString().str();
+    } else if (const auto *Call = dyn_cast<CallExpr>(Arg)) {
+      const FunctionDecl *Callee = Call->getDirectCallee();
+      if (Callee && Callee->getIdentifier() && Callee->getName() == "init" &&
+          Call->getNumArgs() == 1)
+        Record.Init = sourceText(Call->getArg(0), Context);
+    } else if (const auto *Ctor = dyn_cast<CXXConstructExpr>(Arg)) {
+      if (Ctor->getConstructor()->getParent()->getName() == "desc" &&
+          Ctor->getNumArgs() >= 1)
+        // The literal is converted to the StringRef parameter of desc by an
+        // implicit StringRef constructor, which IgnoreImplicit keeps
+        if (const auto *Literal = dyn_cast<StringLiteral>(
+                Ctor->getArg(0)->IgnoreUnlessSpelledInSource()))
+          Record.Desc = Literal->getString().str();
+    } else if (const auto *Ref = dyn_cast<DeclRefExpr>(Arg)) {
+      if (isa<EnumConstantDecl>(Ref->getDecl()) &&
+          (Ref->getDecl()->getName() == "Hidden" ||
+           Ref->getDecl()->getName() == "ReallyHidden"))
+        Record.Hidden = true;
+    }
+  }
+}
 
 class KnobPrinter : public MatchFinder::MatchCallback {
 public:
@@ -41,11 +120,14 @@ public:
     if (!KV ||
         !Context->getSourceManager().isWrittenInMainFile(KV->getLocation()))
       return;
-    outs() << "Potential knob discovered at "
-           << KV->getLocation().printToString(Context->getSourceManager())
-           << "\n";
-    outs() << "Name: " << KV->getNameAsString() << "\n";
-    outs() << "Type: " << KV->getType().getAsString() << "\n";
+    KnobRecord Record =
+        recordAt(KV, KV->getType(), Context->getSourceManager());
+    if (const auto *Construct =
+            dyn_cast<CXXConstructExpr>(KV->getInit()->IgnoreImplicit()))
+      readOptArguments(Construct, *Context, Record);
+    else
+      Record.Init = sourceText(KV->getInit()->IgnoreImpCasts(), *Context);
+    printKnobRecord(Record);
   }
 };
 
@@ -58,11 +140,11 @@ public:
     if (!EC ||
         !Context->getSourceManager().isWrittenInMainFile(EC->getLocation()))
       return;
-    outs() << "Potential knob discovered at "
-           << EC->getLocation().printToString(Context->getSourceManager())
-           << "\n";
-    outs() << "Name: " << EC->getNameAsString() << "\n";
-    outs() << "Type: " << EC->getType().getAsString() << "\n";
+    KnobRecord Record =
+        recordAt(EC, EC->getType(), Context->getSourceManager());
+    if (EC->getInitExpr())
+      Record.Init = sourceText(EC->getInitExpr()->IgnoreImplicit(), *Context);
+    printKnobRecord(Record);
   }
 };
 
@@ -1,8 +1,11 @@
-from datasets import load_dataset
 import subprocess
 import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Threading'))
+from corpus import corpus_modules
 
-ds = load_dataset('llvm-ml/ComPile', split='train', streaming=True)
+# Modules of the local ComPile copy, see ./../Threading/corpus.py
+bitcode_files = corpus_modules(1000)
 
 directory_name = "plain"
 
@@ -15,43 +18,22 @@ if not os.path.exists(directory_name):
 iteration = 0
 index = 0
 
-dataset_iterator = iter(ds)
-
 for i in range(1000):
     iteration = iteration + 1
-    bitcode_module = next(dataset_iterator)['content']
-    IR_module = None
-    dis_command_vector = ['./../../dev/Compilers/build_plain/bin/llvm-dis', '-']
-    with subprocess.Popen(
-            dis_command_vector,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            stdin=subprocess.PIPE) as dis_process:
-        IR_module = dis_process.communicate(
-            input=bitcode_module)[0].decode('utf-8')
-
-    as_command_vector = ['./../../dev/Compilers/build_plain/bin/llvm-as',
-                         '-', '--o', f'test_{directory_name}.bc']
-    with subprocess.Popen(
-            as_command_vector,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            stdin=subprocess.PIPE) as as_process:
-        as_process.communicate(
-            input=IR_module.encode('utf-8'))
+    bitcode_file = bitcode_files[i]
 
     opt_command_vector = [
-        './../../dev/Compilers/build_plain/bin/opt', '-stats', f'test_{directory_name}.bc']
+        './../../dev/Compilers/build_plain/bin/opt', '-stats', bitcode_file]
     opt_O1_command_vector = [
-        './../../dev/Compilers/build_plain/bin/opt', '-O1', '-stats', f'test_{directory_name}.bc']
+        './../../dev/Compilers/build_plain/bin/opt', '-O1', '-stats', bitcode_file]
     opt_O2_command_vector = [
-        './../../dev/Compilers/build_plain/bin/opt', '-O2', '-stats', f'test_{directory_name}.bc']
+        './../../dev/Compilers/build_plain/bin/opt', '-O2', '-stats', bitcode_file]
     opt_O3_command_vector = [
-        './../../dev/Compilers/build_plain/bin/opt', '-O3', '-stats', f'test_{directory_name}.bc']
+        './../../dev/Compilers/build_plain/bin/opt', '-O3', '-stats', bitcode_file]
     opt_Os_command_vector = [
-        './../../dev/Compilers/build_plain/bin/opt', '-Os', '-stats', f'test_{directory_name}.bc']
+        './../../dev/Compilers/build_plain/bin/opt', '-Os', '-stats', bitcode_file]
     opt_Oz_command_vector = [
-        './../../dev/Compilers/build_plain/bin/opt', '-Oz', '-stats', f'test_{directory_name}.bc']
+        './../../dev/Compilers/build_plain/bin/opt', '-Oz', '-stats', bitcode_file]
 
     output_string = ""
     output_string += "PLAIN STATS> \n"
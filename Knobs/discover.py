@@ -0,0 +1,179 @@
+import os
+import re
+import sys
+import json
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Threading'))
+from store import ContentStore, content_key, file_digest
+
+# Knob discovery over the compile_commands.json of an LLVM build
+# Every translation unit under the target directory, and every header there,
+# is run through the knobs binary with the flags it is built with (-p build),
+# several files per run and several runs at once. The output of a file is
+# cached on the hashes of the binary and of the file, so a second inventory
+# only scans the files that changed. The output has the same format as
+# knobs.py, for process_knobs.py.
+# Headers have no entry in compile_commands.json, clang infers their flags from
+# a source file next to them.
+
+CACHE_DIRECTORY = './cache/knobs'
+
+# Files given to one run of the knobs binary
+FILES_PER_SHARD = 8
+
+HEADER_EXTENSIONS = ['.h', '.hpp']
+
+
+def translation_units(build_directory, target_directory):
+    with open(os.path.join(build_directory, 'compile_commands.json'), 'r') as file:
+        entries = json.load(file)
+
+    target_directory = os.path.realpath(target_directory)
+    files = set()
+    for entry in entries:
+        file_path = os.path.realpath(os.path.join(entry['directory'], entry['file']))
+        if file_path.startswith(target_directory + os.sep):
+            files.add(file_path)
+
+    return sorted(files)
+
+
+def header_files(target_directory):
+    files = []
+    for root, _, names in os.walk(target_directory):
+        for name in names:
+            if any(name.endswith(ext) for ext in HEADER_EXTENSIONS):
+                files.append(os.path.realpath(os.path.join(root, name)))
+
+    return sorted(files)
+
+
+# "Potential knob discovered at <file>:<line>:<column>", then "Name: ..." and "Type: ..."
+location_pattern = re.compile(r'Potential knob discovered at (.+?):(\d+):(\d+)')
+field_pattern = re.compile(r'(Name|Type): (.+)')
+
+
+# Knob records in the output of the knobs binary, as (record, lines) pairs
+# Every knob is one line of JSON. A knobs binary built before the JSON records
+# prints three lines per knob instead, they are read into a record with the
+# file, line, column, name and type. The "Processing <file>" lines and clang
+# diagnostics are skipped.
+def knob_records(lines):
+    text_knob = None
+    text_lines = []
+    for line in lines:
+        stripped = line.strip()
+        if stripped.startswith('{'):
+            try:
+                yield json.loads(stripped), line
+            except json.JSONDecodeError:
+                pass
+            continue
+
+        match = location_pattern.search(stripped)
+        if match:
+            text_knob = {'file': match.group(1), 'line': int(match.group(2)), 'column': int(match.group(3))}
+            text_lines = [line]
+            continue
+
+        match = field_pattern.match(stripped)
+        if match and text_knob is not None:
+            text_knob[match.group(1).lower()] = match.group(2).strip()
+            text_lines.append(line)
+            if 'name' in text_knob and 'type' in text_knob:
+                yield text_knob, ''.join(text_lines)
+                text_knob = None
+
+
+# Splits the output of the knobs binary into the lines of every file
+# by the file of every knob record
+def split_output(output, file_paths):
+    outputs = {file_path: "" for file_path in file_paths}
+    for knob, lines in knob_records(output.splitlines(keepends=True)):
+        file_path = os.path.realpath(knob['file'])
+        if file_path in outputs:
+            outputs[file_path] += lines
+
+    return outputs
+
+
+def run_knobs(binary_path, build_directory, file_paths):
+    result = subprocess.run([binary_path, '-p', build_directory] + file_paths, capture_output=True, text=True)
+    return result.returncode == 0, result.stdout
+
+
+# Output of every file of a shard, None for a file the binary failed on
+# A failed shard is run again one file at a time to find the file that failed
+def scan_shard(binary_path, build_directory, file_paths):
+    succeeded, output = run_knobs(binary_path, build_directory, file_paths)
+    if succeeded:
+        return split_output(output, file_paths)
+
+    if len(file_paths) == 1:
+        return {file_paths[0]: None}
+
+    outputs = {}
+    for file_path in file_paths:
+        outputs.update(scan_shard(binary_path, build_directory, [file_path]))
+    return outputs
+
+
+def discover_knobs(binary_path, build_directory, file_paths, num_workers, cache):
+    binary_digest = file_digest(binary_path)
+    keys = {file_path: content_key(binary_digest, file_digest(file_path)) for file_path in file_paths}
+
+    outputs = {}
+    missing = []
+    for file_path in file_paths:
+        output = cache.get(keys[file_path])
+        if output is None:
+            missing.append(file_path)
+        else:
+            outputs[file_path] = output
+
+    print(f"Scanning {len(missing)} of {len(file_paths)} files, the others are cached", file=sys.stderr)
+
+    shards = [missing[i:i + FILES_PER_SHARD] for i in range(0, len(missing), FILES_PER_SHARD)]
+    with ThreadPoolExecutor(max_workers=num_workers) as executor:
+        for shard_outputs in executor.map(lambda shard: scan_shard(binary_path, build_directory, shard), shards):
+            for file_path, output in shard_outputs.items():
+                outputs[file_path] = output
+                if output is not None:
+                    cache.put(keys[file_path], output)
+
+    return outputs
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 4:
+        print("Usage: python3 discover.py /path/to/binary /path/to/build /path/to/directory")
+        sys.exit(1)
+
+    binary_path = sys.argv[1]
+    build_directory = sys.argv[2]
+    target_directory = sys.argv[3]
+
+    if not os.path.isfile(binary_path):
+        print(f"Error: Binary '{binary_path}' not found.")
+        sys.exit(1)
+
+    if not os.path.isfile(os.path.join(build_directory, 'compile_commands.json')):
+        print(f"Error: No compile_commands.json in '{build_directory}'.")
+        sys.exit(1)
+
+    if not os.path.isdir(target_directory):
+        print(f"Error: Directory '{target_directory}' not found.")
+        sys.exit(1)
+
+    num_workers = int(os.environ.get('NUM_WORKERS', os.cpu_count() or 1))
+
+    file_paths = translation_units(build_directory, target_directory) + header_files(target_directory)
+    outputs = discover_knobs(binary_path, build_directory, file_paths, num_workers, ContentStore(CACHE_DIRECTORY))
+
+    for file_path in file_paths:
+        if outputs[file_path] is None:
+            print(f"Failed {file_path}", file=sys.stderr)
+            continue
+        print(f"Processing {file_path}")
+        print(outputs[file_path])
@@ -1,36 +1,21 @@
-import re
 from tabulate import tabulate
+from discover import knob_records
 
+# Every knob record of the knobs binary output, the JSON lines or the three
+# text lines of an older binary, see knob_records
 def discover_potential_knobs(file_path):
-    pattern_one = r"Potential knob discovered at (.+)"
-    pattern_two = r"Name: (.+)"
-    pattern_three = r"Type: (.+)"
-    locations = []
-    Names = []
-    Types = []
-
     with open(file_path, 'r') as file:
-        for line in file:
-            match_one = re.search(pattern_one, line)
-            match_two = re.search(pattern_two, line)
-            match_three = re.search(pattern_three, line)
-            if match_one:
-                location = match_one.group(1)
-                locations.append(location.strip())
-            elif match_two:
-                name = match_two.group(1)
-                Names.append(name.strip())
-            elif match_three:
-                type = match_three.group(1)
-                Types.append(type.strip())
-    return (locations, Names, Types)
+        return [knob for knob, _ in knob_records(file)]
 
 def remove_substring_from_locations(locations, substring):
     cleaned_locations = [location.replace(substring, '') for location in locations]
     return cleaned_locations
 
 file_path = 'all_knobs.txt'
-locations,names,types = discover_potential_knobs(file_path)
+knobs = discover_potential_knobs(file_path)
+locations = [f"{knob['file']}:{knob['line']}:{knob['column']}" for knob in knobs]
+names = [knob['name'] for knob in knobs]
+types = [knob['type'] for knob in knobs]
 locations = remove_substring_from_locations(locations, '/home/shogo/master/gsoc/../dev/llvm-project/')
 tabulate_array = []
 
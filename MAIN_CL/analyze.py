@@ -8,6 +8,8 @@ import sys
 import re
 import os
 from colorama import init, Fore, Back, Style
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Threading'))
+from stat_matrix import matrix_to_dict, merge_stat_dicts, varying_stats_mask
 init()
 
 # Constant for the pattern of the line
@@ -66,13 +68,27 @@ def process_file(file_path, stats_dict):
                 key = f"{description} ({component})"
                 stats_dict[key] += value
 
+# Process a single stats_N.jsonl file, the records are already numeric
+# so there is nothing to match, the counts of every level are added up
+def process_json_file(file_path, stats_dict):
+    with open(file_path, 'r') as file:
+        for line in file:
+            if not line.strip():
+                continue
+            for level_stats in json.loads(line)['stats'].values():
+                for key, value in level_stats.items():
+                    stats_dict[key] += value
+
 # Collect stats for all files present in one directory
 def process_directory(directory_path):
     directory_stats_dict = defaultdict(int)
     for root, dirs, files in os.walk(directory_path):
         for file in files:
             file_path = os.path.join(root, file)
-            process_file(file_path, directory_stats_dict)
+            if file.endswith('.jsonl'):
+                process_json_file(file_path, directory_stats_dict)
+            else:
+                process_file(file_path, directory_stats_dict)
     return dict(directory_stats_dict)
 
 from pathlib import Path
@@ -120,31 +136,12 @@ if __name__ == "__main__":
                 Fore.GREEN + f"Successfully collected stats for directory {directory}:" + Fore.RESET)
             directory_dict.append(directory_stats_dict)
 
-        merged_dict = {}
-
-        for idx, directory_stats_dict in enumerate(directory_dict):
-            for key, value in directory_stats_dict.items():
-                if key in merged_dict:
-                    while len(merged_dict[key]) < idx:
-                        merged_dict[key].append(0)
-                    merged_dict[key].append(value)
-                else:
-                    merged_dict[key] = []
-                    for _ in range(idx):
-                        merged_dict[key].append(0)
-                    merged_dict[key].append(value)
-
-        num_directories = len(directory_dict)
-
-        for key in merged_dict.keys():
-            while len(merged_dict[key]) < num_directories:
-                merged_dict[key].append(0)
+        stat_keys, stat_matrix = merge_stat_dicts(directory_dict)
 
         print(Fore.BLUE +
             f"Successfully merged dictionaries for the knob : {knob_name} " + Fore.RESET)
 
-        filtered_dict = {key: values for key, values in merged_dict.items()
-                        if len(set(values)) > 1}
+        filtered_dict = matrix_to_dict(stat_keys, stat_matrix, varying_stats_mask(stat_matrix))
 
         final_dict = {}
 
@@ -4,9 +4,11 @@ import os
 import glob
 import json
 import numpy as np
-from scipy.stats import pearsonr
+import sys
 import matplotlib.pyplot as plt
 import matplotlib.patches as mpatches
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Threading'))
+from correlation import correlate_knobs, correlations_by_knob, save_correlation_table
 
 def generate_values(number):
     # Some Exceptional Values
@@ -162,23 +164,18 @@ def json_to_dict_with_arrays(file_path):
         result[key] = value
     return result
 
-# Helper function to run the correlation analysis
-def run_analyzer(knob_name, knob_value):
-    file_path = f'./results/{knob_name}_result.json'
-    converted_dict = json_to_dict_with_arrays(file_path)
-
+# Helper function to plot the correlation analysis of a knob
+# correlations is the knob's entry of correlations_by_knob
+def run_analyzer(knob_name, knob_value, correlations):
     x = generate_values(convert_to_appropriate_type(knob_name, knob_value))
     x = np.array(x)
 
-    keys = list(converted_dict.keys())
-    Pearson_correlation_coefficients = []
-    P_Value = []
+    keys = list(correlations.keys())
+    Pearson_correlation_coefficients = [correlations[key][0] for key in keys]
+    P_Value = [correlations[key][1] for key in keys]
 
-    for key, value in converted_dict.items():
-        y = np.array(value)
-        correlation_coefficient, p_value = pearsonr(x, y)
-        Pearson_correlation_coefficients.append(correlation_coefficient)
-        P_Value.append(p_value)
+    if(len(keys) == 0):
+        return
 
     # Plotting
     fig, ax = plt.subplots()
@@ -245,6 +242,12 @@ if __name__ == '__main__':
         print(Fore.BLUE + f"{file}" + Fore.RESET)
     print(Fore.RED + "#################" + Fore.RESET)
 
+    # Correlate every stat of every knob in one go
+    knob_values = {key: generate_values(convert_to_appropriate_type(key, master_stats_dict[key])) for key in processed_files_data}
+    correlation_table = correlate_knobs(knob_values, processed_files_data)
+    save_correlation_table(correlation_table, 'correlation_table.csv')
+    knob_correlations = correlations_by_knob(correlation_table)
+
     for key, value in processed_files_data.items():
         print(key)
-        # run_analyzer(key, master_stats_dict[key])
+        # run_analyzer(key, master_stats_dict[key], knob_correlations.get(key, {}))
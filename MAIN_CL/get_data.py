@@ -1,9 +1,12 @@
 import sys
 import os
-import subprocess
 import re
 # from datasets import load_dataset
 from colorama import init, Fore, Back, Style
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Threading'))
+from sweep import SubprocessBackend, format_stats_block, run_levels, selected_levels, stats_file_name
+from store import BaselineCache, ResultStore
+from knob_source import resolve_knob
 init()
 
 def convert_to_appropriate_type_main(data):
@@ -22,46 +25,6 @@ def convert_to_appropriate_type_main(data):
     except ValueError:
         pass
 
-# This Function reads a given set of lines from the cpp file
-# The starting line and 10 lines ahead of it
-
-
-def read_lines_around(file_path, start_line, num_lines=10):
-    lines = []
-    with open(file_path, 'r') as file:
-        for i, line in enumerate(file):
-            if start_line - 1 <= i <= start_line + num_lines:
-                lines.append(line)
-            if i > start_line + num_lines:
-                break
-    return lines
-
-# This Function extracts the string identifier and the init value
-# from the snippet
-
-
-def extract_init_value_and_string(snippet, function_name):
-    pattern = rf'{
-        function_name}\s*\(\s*"([^"]+)"(?:.*?)cl::init\s*\(\s*([^)]+)\s*\)'
-
-    match = re.search(pattern, snippet, re.DOTALL)
-    if match:
-        return {
-            'string_identifier': match.group(1),
-            'init_value': match.group(2)
-        }
-    else:
-        return None
-
-# This Function processes the input lines, ie. take care of newlines
-
-
-def process_multiline_from_file(file_path, line_number, function_name):
-    lines = read_lines_around(file_path, line_number)
-    snippet = ''.join(line.strip() for line in lines)
-    snippet = snippet.replace(';', ';\n')
-    return extract_init_value_and_string(snippet, function_name)
-
 # this function converts the knob information from the sheet
 # Into useful information that can be used to study them
 
@@ -93,6 +56,7 @@ def process_file(file_path):
     return extracted_data
 
 # Function to get init val and its identifier from the cpp file
+# Every cpp file is indexed once, see knob_source.py
 
 
 def get_identifier_and_init_val(extracted_data):
@@ -102,8 +66,7 @@ def get_identifier_and_init_val(extracted_data):
         file_path = "./../../dev/llvm-project/" + entry['file_path']
         line_number = int(entry['line_number'])
         function_name = entry['function_name']
-        data = process_multiline_from_file(
-            file_path, line_number, function_name)
+        data = resolve_knob(file_path, line_number, function_name)
         if data:
             result_dict[data['string_identifier']] = (data['init_value'])
         else:
@@ -292,6 +255,15 @@ if __name__ == "__main__":
 
     print(Fore.GREEN + "Extracted string identifier and init val of the command line knobs" + Fore.RESET)
 
+    levels = selected_levels()
+
+    backend = SubprocessBackend('./build/bin/opt')
+
+    baseline_cache = BaselineCache('./build/bin/opt')
+
+    # Finished runs are stored, so a restarted sweep only runs what is missing
+    result_store = ResultStore('./build/bin/opt')
+
     iteration = 0
     index = 1
 
@@ -353,63 +325,16 @@ if __name__ == "__main__":
 
             for val in values:
 
-                opt_command_vector = [
-                    './build/bin/opt', f'-{knob_name}={val}', '-stats', f'./bitcode/test_{(i+1)}.bc']
-                opt_O1_command_vector = [
-                    './build/bin/opt', f'-{knob_name}={val}', '-O1', '-stats', f'./bitcode/test_{(i+1)}.bc']
-                opt_O2_command_vector = [
-                    './build/bin/opt', f'-{knob_name}={val}', '-O2', '-stats', f'./bitcode/test_{(i+1)}.bc']
-                opt_O3_command_vector = [
-                    './build/bin/opt', f'-{knob_name}={val}', '-O3', '-stats', f'./bitcode/test_{(i+1)}.bc']
-                opt_Os_command_vector = [
-                    './build/bin/opt', f'-{knob_name}={val}', '-Os', '-stats', f'./bitcode/test_{(i+1)}.bc']
-                opt_Oz_command_vector = [
-                    './build/bin/opt', f'-{knob_name}={val}', '-Oz', '-stats', f'./bitcode/test_{(i+1)}.bc']
-
-                output_string = ""
-                output_string += "PLAIN STATS> \n"
-                with subprocess.Popen(opt_command_vector, stdout=subprocess.PIPE, stderr=subprocess.PIPE) as opt_process:
-                    stdout_data, stderr_data = opt_process.communicate()
-                    stderr_str = stderr_data.decode('utf-8')
-                    output_string += str(stderr_data)[222:-1]
-
-                output_string += "O1 STATS> \n"
-                with subprocess.Popen(opt_O1_command_vector, stdout=subprocess.PIPE, stderr=subprocess.PIPE) as opt_O1_process:
-                    stdout_data, stderr_data = opt_O1_process.communicate()
-                    stderr_str = stderr_data.decode('utf-8')
-                    output_string += str(stderr_data)[222:-1]
-
-                output_string += "O2 STATS> \n"
-                with subprocess.Popen(opt_O2_command_vector, stdout=subprocess.PIPE, stderr=subprocess.PIPE) as opt_O2_process:
-                    stdout_data, stderr_data = opt_O2_process.communicate()
-                    stderr_str = stderr_data.decode('utf-8')
-                    output_string += str(stderr_data)[222:-1]
-
-                output_string += "O3 STATS> \n"
-                with subprocess.Popen(opt_O3_command_vector, stdout=subprocess.PIPE, stderr=subprocess.PIPE) as opt_O3_process:
-                    stdout_data, stderr_data = opt_O3_process.communicate()
-                    stderr_str = stderr_data.decode('utf-8')
-                    output_string += str(stderr_data)[222:-1]
-
-                output_string += "Os STATS> \n"
-                with subprocess.Popen(opt_Os_command_vector, stdout=subprocess.PIPE, stderr=subprocess.PIPE) as opt_Os_process:
-                    stdout_data, stderr_data = opt_Os_process.communicate()
-                    stderr_str = stderr_data.decode('utf-8')
-                    output_string += str(stderr_data)[222:-1]
-
-                output_string += "Oz STATS> \n"
-                with subprocess.Popen(opt_Oz_command_vector, stdout=subprocess.PIPE, stderr=subprocess.PIPE) as opt_Oz_process:
-                    stdout_data, stderr_data = opt_Oz_process.communicate()
-                    stderr_str = stderr_data.decode('utf-8')
-                    output_string += str(stderr_data)[222:-1]
-
-                output_string = output_string.replace('\\n', '\n')
+                output_string = run_levels(knob_name, val, i, backend, levels, default=value, baseline_cache=baseline_cache, result_store=result_store)
 
                 print(iteration, index)
 
-                with open(f'./stats/{knob_name}_{val}/stats_{index}.txt', 'a') as f:
-                    f.write(f"====================================  STATS FOR FILE : {i} ====================================\n")
-                    f.write(output_string)
+                # The first file of a stats file starts it over, so a restarted
+                # sweep does not append the same records a second time
+                mode = 'w' if i % 10 == 0 else 'a'
+
+                with open(f'./stats/{knob_name}_{val}/{stats_file_name(index, backend.stats_mode)}', mode) as f:
+                    f.write(format_stats_block(i, output_string, backend.stats_mode))
 
                 print(Fore.CYAN + f"Wrote Stats for knob {knob_name} with value {val} for Iteration {i}" + Fore.RESET)
 
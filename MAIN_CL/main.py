@@ -2,6 +2,8 @@ import os
 import sys
 import re
 from colorama import init, Fore, Back, Style
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Threading'))
+from knob_source import resolve_knob
 init()
 
 
@@ -21,46 +23,6 @@ def convert_to_appropriate_type_main(data):
     except ValueError:
         pass
 
-# This Function reads a given set of lines from the cpp file
-# The starting line and 10 lines ahead of it
-
-
-def read_lines_around(file_path, start_line, num_lines=10):
-    lines = []
-    with open(file_path, 'r') as file:
-        for i, line in enumerate(file):
-            if start_line - 1 <= i <= start_line + num_lines:
-                lines.append(line)
-            if i > start_line + num_lines:
-                break
-    return lines
-
-# This Function extracts the string identifier and the init value
-# from the snippet
-
-
-def extract_init_value_and_string(snippet, function_name):
-    pattern = rf'{
-        function_name}\s*\(\s*"([^"]+)"(?:.*?)cl::init\s*\(\s*([^)]+)\s*\)'
-
-    match = re.search(pattern, snippet, re.DOTALL)
-    if match:
-        return {
-            'string_identifier': match.group(1),
-            'init_value': match.group(2)
-        }
-    else:
-        return None
-
-# This Function processes the input lines, ie. take care of newlines
-
-
-def process_multiline_from_file(file_path, line_number, function_name):
-    lines = read_lines_around(file_path, line_number)
-    snippet = ''.join(line.strip() for line in lines)
-    snippet = snippet.replace(';', ';\n')
-    return extract_init_value_and_string(snippet, function_name)
-
 # this function converts the knob information from the sheet
 # Into useful information that can be used to study them
 
@@ -92,6 +54,7 @@ def process_file(file_path):
     return extracted_data
 
 # Function to get init val and its identifier from the cpp file
+# Every cpp file is indexed once, see knob_source.py
 
 
 def get_identifier_and_init_val(extracted_data):
@@ -101,8 +64,7 @@ def get_identifier_and_init_val(extracted_data):
         file_path = "./../../dev/llvm-project/" + entry['file_path']
         line_number = int(entry['line_number'])
         function_name = entry['function_name']
-        data = process_multiline_from_file(
-            file_path, line_number, function_name)
+        data = resolve_knob(file_path, line_number, function_name)
         if data:
             result_dict[data['string_identifier']] = (data['init_value'])
         else:
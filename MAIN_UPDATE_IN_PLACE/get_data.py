@@ -1,9 +1,10 @@
 from colorama import init, Fore, Back, Style
 init()
-from datasets import load_dataset
 import subprocess
 import os
 import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Threading'))
+from corpus import corpus_modules
 
 def convert_to_appropriate_type(data, s):
     if s is None or s == '':
@@ -27,18 +28,19 @@ def convert_to_appropriate_type(data, s):
 
 if __name__ == "__main__":
 
-    if not os.path.exists("bitcode"):
-        os.mkdir("bitcode")
-
     if not os.path.exists("stats"):
         os.mkdir("stats")
     
-    ds = load_dataset('llvm-ml/ComPile', split='train', streaming=True)
+    # Modules of the local ComPile copy, see ./../Threading/corpus.py
+    bitcode_files = corpus_modules(1000)
 
     knob_name = os.environ.get('KNOB_NAME')
 
     value = os.environ.get('KNOB_VAL')
 
+    # main.py builds an opt per value, see rebuild.py
+    opt_path = os.environ.get('OPT_PATH', './build/bin/opt')
+
     directory_name = f"{knob_name}_{value}"
 
     if value is not None:
@@ -54,44 +56,22 @@ if __name__ == "__main__":
     iteration = 0
     index = 0
 
-    dataset_iterator = iter(ds)
-
     for i in range(1000):
         iteration = iteration + 1
-        bitcode_module = next(dataset_iterator)['content']
-        IR_module = None
-        dis_command_vector = [
-            './build/bin/llvm-dis', '-']
-        with subprocess.Popen(
-                dis_command_vector,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT,
-                stdin=subprocess.PIPE) as dis_process:
-            IR_module = dis_process.communicate(
-                input=bitcode_module)[0].decode('utf-8')
-
-        as_command_vector = ['./build/bin/llvm-as',
-                            '-', '--o', f'./bitcode/test_{directory_name}.bc']
-        with subprocess.Popen(
-                as_command_vector,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT,
-                stdin=subprocess.PIPE) as as_process:
-            as_process.communicate(
-                input=IR_module.encode('utf-8'))
+        bitcode_file = bitcode_files[i]
 
         opt_command_vector = [
-            './build/bin/opt',  '-stats', f'./bitcode/test_{directory_name}.bc']
+            opt_path,  '-stats', bitcode_file]
         opt_O1_command_vector = [
-            './build/bin/opt', '-O1', '-stats', f'./bitcode/test_{directory_name}.bc']
+            opt_path, '-O1', '-stats', bitcode_file]
         opt_O2_command_vector = [
-            './build/bin/opt', '-O2', '-stats', f'./bitcode/test_{directory_name}.bc']
+            opt_path, '-O2', '-stats', bitcode_file]
         opt_O3_command_vector = [
-            './build/bin/opt', '-O3', '-stats', f'./bitcode/test_{directory_name}.bc']
+            opt_path, '-O3', '-stats', bitcode_file]
         opt_Os_command_vector = [
-            './build/bin/opt', '-Os', '-stats', f'./bitcode/test_{directory_name}.bc']
+            opt_path, '-Os', '-stats', bitcode_file]
         opt_Oz_command_vector = [
-            './build/bin/opt', '-Oz', '-stats', f'./bitcode/test_{directory_name}.bc']
+            opt_path, '-Oz', '-stats', bitcode_file]
 
         output_string = ""
         output_string += "PLAIN STATS> \n"
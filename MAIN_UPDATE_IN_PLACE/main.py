@@ -1,7 +1,9 @@
 import os
 import re
 import sys
+import subprocess
 from colorama import init, Fore, Back, Style
+from rebuild import LLVM_DIRECTORY, RebuildPlan, build_values, replace_knob_value
 init()
 
 # this function converts the knob information from the sheet
@@ -63,7 +65,7 @@ def update_knob_val(file_path, line_number, new_val):
 
     target_line = lines[line_number - 1]
 
-    new_line = re.sub(r'(?<![\w\d])\d+(?![\w\d])', str(new_val), target_line)
+    new_line = replace_knob_value(target_line, new_val)
 
     lines[line_number - 1] = new_line
 
@@ -123,18 +125,48 @@ if __name__ == "__main__":
         with open('directory_name.txt', 'w') as file:
             pass
 
-        knob_val = get_knob_val(process_multiline_from_file( "./../../dev/llvm-project/" + knob['file_path'], knob['line_number']))
+        knob_val = get_knob_val(process_multiline_from_file(LLVM_DIRECTORY + knob['file_path'], knob['line_number']))
 
         values = generate_values(knob_val)
 
-        for val in values:
+        # REBUILD=make patches the LLVM sources and runs make for every value, one after the other
+        if os.environ.get('REBUILD') == 'make':
+            for val in values:
+                with open('directory_name.txt', 'a') as file:
+                    file.write(f"./stats/{knob['function_name']}_{val}\n")
+                update_knob_val(LLVM_DIRECTORY + knob['file_path'], knob['line_number'], val)
+                os.environ['KNOB_VAL'] = str(val)
+                os.system("cd build && make -j 8")
+                os.system("python get_data.py")
+                print(Fore.GREEN + f"Successfully updated knob value to {val} and generated data for {knob['function_name']}_{val} directory." + Fore.RESET)
+        else:
             with open('directory_name.txt', 'a') as file:
-                file.write(f"./stats/{knob['function_name']}_{val}\n")
-            update_knob_val("./../../dev/llvm-project/" + knob['file_path'], knob['line_number'], val)
-            os.environ['KNOB_VAL'] = str(val)
-            os.system("cd build && make -j 8")
-            os.system("python get_data.py")
-            print(Fore.GREEN + f"Successfully updated knob value to {val} and generated data for {knob['function_name']}_{val} directory." + Fore.RESET)
+                for val in values:
+                    file.write(f"./stats/{knob['function_name']}_{val}\n")
+
+            # Every value gets its own opt in ./builds, see rebuild.py
+            plan = RebuildPlan(LLVM_DIRECTORY + knob['file_path'])
+            failed_values = []
+            for val, opt_path in build_values(plan, knob['function_name'], knob['line_number'], values):
+                if opt_path is None:
+                    failed_values.append(val)
+                    plan.remove(f"{knob['function_name']}_{val}")
+                    continue
+
+                # get_data.py gets its own environment, the one of this script is left as it is
+                # The shared libraries of the value tree come before any the user has set
+                library_path = os.path.abspath(os.path.join(os.path.dirname(opt_path), '..', 'lib'))
+                if os.environ.get('LD_LIBRARY_PATH'):
+                    library_path += os.pathsep + os.environ['LD_LIBRARY_PATH']
+                env = dict(os.environ, KNOB_VAL=str(val), OPT_PATH=opt_path, LD_LIBRARY_PATH=library_path)
+                subprocess.run([sys.executable, 'get_data.py'], env=env)
+                plan.remove(f"{knob['function_name']}_{val}")
+                print(Fore.GREEN + f"Successfully built opt with knob value {val} and generated data for {knob['function_name']}_{val} directory." + Fore.RESET)
+
+            # The builds not started after the first failure were cancelled
+            if failed_values:
+                print(Fore.RED + f"Could not build opt for {knob['function_name']} with the values {', '.join(map(str, sorted(failed_values)))}, the other values not yet built were cancelled" + Fore.RESET)
+                sys.exit(1)
 
         print(Fore.BLUE + f"Successfully generated data for all {knob['function_name']} directories." + Fore.RESET)
 
@@ -0,0 +1,255 @@
+from colorama import Fore
+import os
+import re
+import sys
+import json
+import shutil
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# Incremental builds of opt for every value of a knob
+# Instead of patching the LLVM sources and running make for every value, each
+# value gets a build tree of its own under ./builds, made of hard links to the
+# files of ./build its commands read (the inputs ninja -t query gives for what is
+# linked again, opt and the shared libraries it loads), so it costs no space and
+# keeps every object already built. The patched source is compiled into that
+# tree and only what opt needs is linked again, the library holding the object
+# and, for a static build, opt itself.
+# Values are built at the same time, and the LLVM sources are never modified.
+# The build must be a Ninja build (run.sh), the commands are taken from it with
+# ninja -t. Every output is removed from the value tree before it is written, so
+# a hard link to a file of ./build is never written through.
+
+LLVM_DIRECTORY = './../../dev/llvm-project/'
+
+BUILD_DIRECTORY = './build'
+
+VALUE_BUILDS_DIRECTORY = './builds'
+
+# Values built at the same time
+PARALLEL_BUILDS = 4
+
+OPT_TARGET_FILE = 'bin/opt'
+
+PATCHED_DIRECTORY = 'patched_sources'
+
+
+# Puts new_val in place of the number of a knob declaration line
+def replace_knob_value(line, new_val):
+    return re.sub(r'(?<![\w\d])\d+(?![\w\d])', str(new_val), line)
+
+
+def ninja_tool(build_directory, *args):
+    result = subprocess.run(['ninja', '-C', build_directory, '-t'] + list(args), stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    if result.returncode != 0:
+        print(Fore.RED + f"ninja -t {' '.join(args)} failed in {build_directory}: {result.stderr.strip()}" + Fore.RESET)
+        sys.exit(1)
+    return result.stdout
+
+
+# {'input': [...], 'outputs': [...]} of a build file, from ninja -t query
+# Order-only inputs ("|| ...") are left out, and implicit ones ("| ...") unless
+# implicit is set. CMake lists the libraries a target links as implicit inputs.
+def query(build_directory, path, implicit=False):
+    sections = {'input': [], 'outputs': []}
+    section = None
+    for line in ninja_tool(build_directory, 'query', path).splitlines():
+        stripped = line.strip()
+        if line.startswith('  ') and not line.startswith('    '):
+            section = 'outputs' if stripped == 'outputs:' else 'input'
+        elif not line.startswith('    ') or section is None or stripped.startswith('||'):
+            continue
+        elif stripped.startswith('| '):
+            if implicit:
+                sections[section].append(stripped[2:])
+        else:
+            sections[section].append(stripped)
+
+    return sections
+
+
+def final_command(build_directory, target):
+    return ninja_tool(build_directory, 'commands', '-s', target).strip().splitlines()[-1]
+
+
+def is_shared_library(path):
+    return '.so' in os.path.basename(path)
+
+
+def is_library(path):
+    return path.endswith('.a') or is_shared_library(path)
+
+
+# Object file of a source and the library it goes in, from compile_commands.json
+def source_object(build_directory, source_path):
+    with open(os.path.join(build_directory, 'compile_commands.json'), 'r') as file:
+        entries = json.load(file)
+
+    source_path = os.path.realpath(source_path)
+    for entry in entries:
+        if os.path.realpath(os.path.join(entry['directory'], entry['file'])) != source_path:
+            continue
+        if 'output' in entry:
+            return entry['output']
+        arguments = entry['arguments'] if 'arguments' in entry else entry['command'].split()
+        return arguments[arguments.index('-o') + 1]
+
+    print(Fore.RED + f"{source_path} is not built in {build_directory}, is compile_commands.json up to date?" + Fore.RESET)
+    sys.exit(1)
+
+
+# Files to build again, in order, after the object of a source has changed
+# Shared library build: the library of the object, opt loads it at run time
+# Static build: the archive of the object, then opt, or the libLLVM dylib opt links
+def rebuild_chain(build_directory, object_path):
+    libraries = [path for path in query(build_directory, object_path)['outputs'] if is_library(path)]
+    if len(libraries) != 1:
+        print(Fore.RED + f"Expected one library built from {object_path}, found {libraries}" + Fore.RESET)
+        sys.exit(1)
+
+    library, = libraries
+    if is_shared_library(library):
+        return [library]
+
+    opt_inputs = query(build_directory, OPT_TARGET_FILE, implicit=True)['input']
+    chain = [library]
+    for path in query(build_directory, library)['outputs']:
+        if path in chain:
+            continue
+        if path == OPT_TARGET_FILE or (is_shared_library(path) and path in opt_inputs):
+            chain.append(path)
+
+    # Relinking the archive alone would leave opt with the old code, and every
+    # value would give the same stats
+    if len(chain) == 1:
+        print(Fore.RED + f"Neither {OPT_TARGET_FILE} nor a library it loads is built from {library}" + Fore.RESET)
+        sys.exit(1)
+
+    return chain
+
+
+# Files of the build tree a value build reads, relative to the build directory
+# The inputs of every file of the chain and opt with the shared libraries it
+# loads, without the files the value build writes. Absolute paths, eg. the
+# sources and the system libraries, are read where they are.
+def tree_files(build_directory, object_path, chain):
+    outputs = {object_path} | set(chain)
+    opt_inputs = query(build_directory, OPT_TARGET_FILE, implicit=True)['input']
+
+    paths = {OPT_TARGET_FILE} | {path for path in opt_inputs if is_shared_library(path)}
+    for path in chain:
+        paths.update(query(build_directory, path, implicit=True)['input'])
+
+    return sorted(path for path in paths - outputs if not os.path.isabs(path) and os.path.lexists(os.path.join(build_directory, path)))
+
+
+# Hard links the given files of the build tree into a new tree, a symlink stays a
+# symlink and the file it points to is linked as well
+def link_build_tree(build_directory, tree_directory, paths, output_paths):
+    if os.path.exists(tree_directory):
+        shutil.rmtree(tree_directory)
+
+    pending = list(paths)
+    while pending:
+        path = pending.pop()
+        source = os.path.join(build_directory, path)
+        target = os.path.join(tree_directory, path)
+        if os.path.lexists(target):
+            continue
+
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        if os.path.islink(source):
+            os.symlink(os.readlink(source), target)
+            pending.append(os.path.normpath(os.path.join(os.path.dirname(path), os.readlink(source))))
+        elif os.path.isdir(source):
+            shutil.copytree(source, target, copy_function=os.link, symlinks=True)
+        else:
+            os.link(source, target)
+
+    # The directories the value build writes to
+    for path in output_paths:
+        os.makedirs(os.path.dirname(os.path.join(tree_directory, path)), exist_ok=True)
+
+
+def run_build_command(command, tree_directory, output_path):
+    output_file = os.path.join(tree_directory, output_path)
+    if os.path.lexists(output_file):
+        os.unlink(output_file)
+
+    result = subprocess.run(command, shell=True, cwd=tree_directory, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    if result.returncode != 0:
+        print(Fore.RED + f"Building {output_path} in {tree_directory} failed:\n{result.stdout}" + Fore.RESET)
+        return False
+
+    return True
+
+
+# Plan shared by all the values of a knob: the object of the source, its
+# compile command and the link commands after it
+class RebuildPlan:
+    def __init__(self, source_path, build_directory=BUILD_DIRECTORY):
+        self.source_path = source_path
+        self.build_directory = build_directory
+        self.object_path = source_object(build_directory, source_path)
+
+        # The compile command names the source the way build.ninja does
+        self.ninja_source = query(build_directory, self.object_path)['input'][0]
+        self.compile_command = final_command(build_directory, self.object_path)
+        if f'-c {self.ninja_source}' not in self.compile_command:
+            print(Fore.RED + f"Cannot find the source in the compile command of {self.object_path}" + Fore.RESET)
+            sys.exit(1)
+
+        chain = rebuild_chain(build_directory, self.object_path)
+        self.link_commands = [(path, final_command(build_directory, path)) for path in chain]
+        self.tree_files = tree_files(build_directory, self.object_path, chain)
+
+    def tree_directory(self, run_name):
+        return os.path.join(VALUE_BUILDS_DIRECTORY, run_name)
+
+    # Builds opt with line line_number of the source set to val, returns its path
+    # or None when the build fails
+    def build(self, run_name, line_number, val):
+        tree_directory = self.tree_directory(run_name)
+        link_build_tree(self.build_directory, tree_directory, self.tree_files, [self.object_path] + [path for path, _ in self.link_commands])
+
+        with open(self.source_path, 'r') as file:
+            lines = file.readlines()
+        lines[line_number - 1] = replace_knob_value(lines[line_number - 1], val)
+
+        patched_path = os.path.abspath(os.path.join(tree_directory, PATCHED_DIRECTORY, os.path.basename(self.source_path)))
+        os.makedirs(os.path.dirname(patched_path), exist_ok=True)
+        with open(patched_path, 'w') as file:
+            file.writelines(lines)
+
+        # "..." includes are looked up next to the original source
+        source_directory = os.path.dirname(os.path.abspath(self.source_path))
+        compile_command = self.compile_command.replace(f'-c {self.ninja_source}', f'-iquote {source_directory} -c {patched_path}')
+
+        if not run_build_command(compile_command, tree_directory, self.object_path):
+            return None
+        for path, command in self.link_commands:
+            if not run_build_command(command, tree_directory, path):
+                return None
+
+        return os.path.join(tree_directory, OPT_TARGET_FILE)
+
+    def remove(self, run_name):
+        shutil.rmtree(self.tree_directory(run_name), ignore_errors=True)
+
+
+# Builds opt for every value on PARALLEL_BUILDS threads
+# Yields (val, opt_path) as the builds finish, opt_path is None for a failed build.
+# After a failed build the builds that have not started are cancelled, the ones
+# running are still finished and yielded.
+def build_values(plan, knob_name, line_number, values, parallel_builds=PARALLEL_BUILDS):
+    with ThreadPoolExecutor(max_workers=parallel_builds) as executor:
+        futures = {executor.submit(plan.build, f'{knob_name}_{val}', line_number, val): val for val in values}
+        for future in as_completed(futures):
+            if future.cancelled():
+                continue
+
+            opt_path = future.result()
+            if opt_path is None:
+                for pending in futures:
+                    pending.cancel()
+            yield futures[future], opt_path
@@ -2,6 +2,9 @@ from colorama import init, Fore, Back, Style
 init()
 import os
 import re
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Threading'))
+from stat_matrix import merge_stat_dicts, spread_stats_mask
 from collections import defaultdict
 from yellowbrick.features import ParallelCoordinates
 import numpy as np
@@ -41,39 +44,16 @@ for directory in directories:
     print(Fore.GREEN + f"Successfully collected stats for directory {directory}:")
     director_dict.append(directory_stats_dict)
 
-merged_dict = {}
-
-for idx, directory_stats_dict in enumerate(director_dict):
-    for key, value in directory_stats_dict.items():
-        if key in merged_dict:
-            while len(merged_dict[key]) < idx:
-                merged_dict[key].append(0)
-            merged_dict[key].append(value)
-        else:
-            merged_dict[key] = []
-            for _ in range(idx):
-                merged_dict[key].append(0)
-            merged_dict[key].append(value)
-
+stat_keys, stat_matrix = merge_stat_dicts(director_dict)
 num_directories = len(director_dict)
-for key in merged_dict.keys():
-    while len(merged_dict[key]) < num_directories:
-        merged_dict[key].append(0)
 
 print(Style.RESET_ALL + "Successfully merged dictionaries:")
 
-mean_dict = {key: np.mean(values) for key, values in merged_dict.items()}
 threshold = 100
-filtered_dict = {key: values for key, values in merged_dict.items() 
-                 if not all(abs(value - mean_dict[key]) <= threshold for value in values)}
+mask = spread_stats_mask(stat_matrix, threshold)
 
-X = [[] for _ in range(num_directories)]
-features = []
-for inst in filtered_dict:
-    features.append(inst)
-    for idx in range(num_directories):
-        X[idx].append(filtered_dict[inst][idx])
-X = np.array(X)
+features = [key for key, keep in zip(stat_keys, mask) if keep]
+X = stat_matrix[mask].T
 
 y = np.array([i for i in range(num_directories)])
 classes = ["Normal Compiler", "Compiler with recursion limit=6", "Compiler with cl_limit=500"]
@@ -3,6 +3,8 @@ init()
 import os
 import re
 import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Threading'))
+from stat_matrix import matrix_to_dict, merge_stat_dicts, varying_stats_mask
 from collections import defaultdict
 from yellowbrick.features import ParallelCoordinates
 import numpy as np
@@ -85,29 +87,11 @@ for directory in directories:
     print(Fore.GREEN + f"Successfully collected stats for directory {directory}:")
     director_dict.append(directory_stats_dict)
 
-merged_dict = {}
-
-for idx, directory_stats_dict in enumerate(director_dict):
-    for key, value in directory_stats_dict.items():
-        if key in merged_dict:
-            while len(merged_dict[key]) < idx:
-                merged_dict[key].append(0)
-            merged_dict[key].append(value)
-        else:
-            merged_dict[key] = []
-            for _ in range(idx):
-                merged_dict[key].append(0)
-            merged_dict[key].append(value)
-
-num_directories = len(director_dict)
-for key in merged_dict.keys():
-    while len(merged_dict[key]) < num_directories:
-        merged_dict[key].append(0)
+stat_keys, stat_matrix = merge_stat_dicts(director_dict)
 
 print(Fore.BLUE + "Successfully merged dictionaries:")
 
-filtered_dict = {key: values for key, values in merged_dict.items() 
-                 if len(set(values)) > 1}
+filtered_dict = matrix_to_dict(stat_keys, stat_matrix, varying_stats_mask(stat_matrix))
 
 final_dict = {}
 
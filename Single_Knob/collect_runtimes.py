@@ -1,9 +1,11 @@
 from colorama import init, Fore, Back, Style
 init()
-import subprocess
+import os
 import sys
-import re
 import json
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Threading'))
+from sweep import OPT_LEVELS
+from timing import measurement_cpus, run_measurements, selected_timer
 
 def generate_values(number):
     # Some Exceptional Values
@@ -156,9 +158,6 @@ def read_key_value_file(file_path):
 
     return config_dict
 
-def get_variable_name(value, scope):
-    return [name for name in scope if scope[name] is value]
-
 if __name__ == "__main__":
 
     with open("study_knob.txt", "r") as f:
@@ -167,7 +166,16 @@ if __name__ == "__main__":
     file_path = 'knobs_decoded.txt'
     master_stats_dict = read_key_value_file(file_path)
 
+    # TIMER=rusage (default) or TIMER=perf, see ./../Threading/timing.py
+    timer = selected_timer()
+
+    # One measurement at a time per CPU, PIN_CPUS=<cpus> to choose them
+    cpus = measurement_cpus()
+    print(Fore.BLUE + f"Measuring on CPUs {', '.join(map(str, cpus))}" + Fore.RESET)
+
     perf_time_dict = {}
+    # Mean over the configurations of the median of every metric of the timer
+    perf_usage_dict = {}
 
     for knob in knobs:
         knob_val = master_stats_dict[knob]
@@ -175,52 +183,42 @@ if __name__ == "__main__":
         values = generate_values(convert_to_appropriate_type(knob, knob_val))
 
         perf_time_dict[knob] = {}
+        perf_usage_dict[knob] = {}
 
-        for val in values:
-            print(Fore.BLUE + f"Running for {knob} with {val}" + Fore.RESET)
+        print(Fore.BLUE + f"Running for {knob} with {', '.join(map(str, values))}" + Fore.RESET)
 
-            perf_time_dict[knob][val] = []
+        # Every (value, bitcode file, level) of the knob, run in a random order
+        jobs = []
+        for val in values:
             for i in range(100):
-                perf_command_vector = ['sudo', 'perf', 'stat', './../../dev/llvm-project/build/bin/opt', f'-{knob}={val}', f'./../MAIN_CL/bitcode/test_{i}.bc']
-
-                perf_O1_command_vector = ['sudo', 'perf', 'stat', './../../dev/llvm-project/build/bin/opt', f'-{knob}={val}', '-O1', f'./../MAIN_CL/bitcode/test_{i}.bc']
-
-                perf_O2_command_vector = ['sudo', 'perf', 'stat', './../../dev/llvm-project/build/bin/opt', f'-{knob}={val}', '-O2', f'./../MAIN_CL/bitcode/test_{i}.bc']
-
-                perf_O3_command_vector = ['sudo', 'perf', 'stat', './../../dev/llvm-project/build/bin/opt', f'-{knob}={val}', '-O3', f'./../MAIN_CL/bitcode/test_{i}.bc']
-
-                perf_Os_command_vector = ['sudo', 'perf', 'stat', './../../dev/llvm-project/build/bin/opt', f'-{knob}={val}', '-Os', f'./../MAIN_CL/bitcode/test_{i}.bc']
-
-                perf_Oz_command_vector = ['sudo', 'perf', 'stat', './../../dev/llvm-project/build/bin/opt', f'-{knob}={val}', '-Oz', f'./../MAIN_CL/bitcode/test_{i}.bc']
-
-                commands = [perf_command_vector, perf_O1_command_vector, perf_O2_command_vector, perf_O3_command_vector, perf_Os_command_vector, perf_Oz_command_vector]
-
-                for command_vector in commands:
-                    output_string = ""
-                    with subprocess.Popen(command_vector, stdout=subprocess.PIPE, stderr=subprocess.PIPE) as opt_process:
-                        _, stderr_data = opt_process.communicate()
-
-                        output_string += stderr_data.decode('utf-8')
+                for level, level_flags in OPT_LEVELS.items():
+                    command_vector = ['./../../dev/llvm-project/build/bin/opt', f'-{knob}={val}'] + level_flags + [f'./../MAIN_CL/bitcode/test_{i}.bc']
+                    jobs.append(((val, i, level), command_vector))
+
+        # Distribution of the wall time of every (bitcode file, level), per value
+        configurations = {val: [] for val in values}
+        for count, ((val, i, level), summary) in enumerate(run_measurements(jobs, timer, cpus), 1):
+            configurations[val].append({'file': i, 'level': level, **summary})
+            if count % 100 == 0:
+                print(Fore.YELLOW + f"done with {count} of {len(jobs)} configurations" + Fore.RESET)
+
+        level_order = list(OPT_LEVELS)
+        for val in values:
+            val_configurations = sorted(configurations[val], key=lambda configuration: (configuration['file'], level_order.index(configuration['level'])))
 
-                    elapsed_time_match = re.search(r'\s+(\d+\.\d+) seconds time elapsed', output_string)
-                    
-                    if elapsed_time_match:
-                        elapsed_time = elapsed_time_match.group(1)
-                        perf_time_dict[knob][val].append(float(elapsed_time))
-                    else:
-                        print(Fore.RED + "Elapsed time not found in the output." + Fore.RESET)
-                        sys.exit(1)
-                    
-                    print(Fore.GREEN + f"done with {get_variable_name(command_vector, locals())[0]}" + Fore.RESET)
-                
-                print(Fore.YELLOW + f"done with bitcode file {i}" + Fore.RESET)
-            
-            perf_time_dict[knob][val] = sum(perf_time_dict[knob][val]) / len(perf_time_dict[knob][val])
+            # "time" is the mean over the configurations of their median, what study.py plots
+            perf_time_dict[knob][val] = {
+                'time': sum(configuration['median'] for configuration in val_configurations) / len(val_configurations),
+                'configurations': val_configurations,
+            }
+            perf_usage_dict[knob][val] = {metric: sum(configuration['usage'][metric] for configuration in val_configurations) / len(val_configurations) for metric in val_configurations[0]['usage']}
 
     file_path = f"./perf_time.json"
 
-    print(perf_time_dict)
+    print({knob: {val: entry['time'] for val, entry in times.items()} for knob, times in perf_time_dict.items()})
 
     with open(file_path, 'w') as file:
         json.dump(perf_time_dict, file)
 
+    with open("./perf_usage.json", 'w') as file:
+        json.dump(perf_usage_dict, file)
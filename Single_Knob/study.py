@@ -180,7 +180,8 @@ def generate_step_function_graph(knob_name, knob_val, stats_values_dict):
         data = json.load(file)
     time_arr = []
     for _, value in data[knob_name].items():
-        time_arr.append(value)
+        # Newer perf_time.json files keep the distribution of every run next to the time
+        time_arr.append(value['time'] if isinstance(value, dict) else value)
 
     keys = []
     normalized_values_dict = {}
@@ -8,6 +8,8 @@ import sys
 import re
 import os
 from colorama import init, Fore, Back, Style
+from stats_table import aggregate_knob_table, has_knob_table
+from stat_matrix import matrix_to_dict, merge_stat_dicts, varying_stats_mask
 init()
 
 # Constant for the pattern of the line
@@ -66,16 +68,29 @@ def process_file(file_path, stats_dict):
                 key = f"{description} ({component})"
                 stats_dict[key] += value
 
+# Process a single stats_N.jsonl file, the records are already numeric
+# so there is nothing to match, the counts of every level are added up
+def process_json_file(file_path, stats_dict):
+    with open(file_path, 'r') as file:
+        for line in file:
+            if not line.strip():
+                continue
+            for level_stats in json.loads(line)['stats'].values():
+                for key, value in level_stats.items():
+                    stats_dict[key] += value
+
 # Collect stats for all files present in one directory
 def process_directory(directory_path):
     valid_files = ['stats_3.txt','stats_8.txt','stats_1.txt','stats_4.txt','stats_6.txt','stats_9.txt','stats_2.txt','stats_10.txt','stats_7.txt','stats_5.txt']
+    valid_json_files = [file[:-4] + '.jsonl' for file in valid_files]
     directory_stats_dict = defaultdict(int)
     for root, _, files in os.walk(directory_path):
         for file in files:
-            if file not in valid_files:
-                continue
             file_path = os.path.join(root, file)
-            process_file(file_path, directory_stats_dict)
+            if file in valid_json_files:
+                process_json_file(file_path, directory_stats_dict)
+            elif file in valid_files:
+                process_file(file_path, directory_stats_dict)
     return dict(directory_stats_dict)
 
 from pathlib import Path
@@ -115,39 +130,27 @@ if __name__ == "__main__":
         except IOError:
             print(f"Error: Could not read the file '{directory_path}'.")
 
-        directory_dict = []
-
-        for directory in directories:
-            directory_stats_dict = process_directory(directory)
+        if has_knob_table(knob_name):
+            # Columnar table written by main.py, one vectorized group-by instead of parsing text
+            _, stat_keys, value_matrix = aggregate_knob_table(knob_name)
+            stat_matrix = value_matrix.T
             print(
-                Fore.GREEN + f"Successfully collected stats for directory {directory}:" + Fore.RESET)
-            directory_dict.append(directory_stats_dict)
-
-        merged_dict = {}
+                Fore.GREEN + f"Successfully aggregated the stats table for the knob : {knob_name}" + Fore.RESET)
+        else:
+            directory_dict = []
 
-        for idx, directory_stats_dict in enumerate(directory_dict):
-            for key, value in directory_stats_dict.items():
-                if key in merged_dict:
-                    while len(merged_dict[key]) < idx:
-                        merged_dict[key].append(0)
-                    merged_dict[key].append(value)
-                else:
-                    merged_dict[key] = []
-                    for _ in range(idx):
-                        merged_dict[key].append(0)
-                    merged_dict[key].append(value)
-
-        num_directories = len(directory_dict)
+            for directory in directories:
+                directory_stats_dict = process_directory(directory)
+                print(
+                    Fore.GREEN + f"Successfully collected stats for directory {directory}:" + Fore.RESET)
+                directory_dict.append(directory_stats_dict)
 
-        for key in merged_dict.keys():
-            while len(merged_dict[key]) < num_directories:
-                merged_dict[key].append(0)
+            stat_keys, stat_matrix = merge_stat_dicts(directory_dict)
 
         print(Fore.BLUE +
             f"Successfully merged dictionaries for the knob : {knob_name} " + Fore.RESET)
 
-        filtered_dict = {key: values for key, values in merged_dict.items()
-                        if len(set(values)) > 1}
+        filtered_dict = matrix_to_dict(stat_keys, stat_matrix, varying_stats_mask(stat_matrix))
 
         final_dict = {}
 
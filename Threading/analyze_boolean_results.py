@@ -6,8 +6,11 @@ import json
 import numpy as np
 import sys
 from scipy.stats import pearsonr
+import matplotlib
+matplotlib.use('Agg')
 import matplotlib.pyplot as plt
 import matplotlib.patches as mpatches
+from render import chart_path, render_charts, save_figure
 
 def generate_values(number):
     # Some Exceptional Values
@@ -169,10 +172,8 @@ def json_to_dict_with_arrays(file_path):
     return result
 
 # Helper function to run the correlation analysis
-def run_analyzer(knob_name):
-    file_path = f'./Batch5_Results/{knob_name}_result.json'
-    data = json_to_dict_with_arrays(file_path)
-
+# data is the content of ./Batch5_Results/<knob_name>_result.json
+def run_analyzer(knob_name, data):
     # Extract keys (categories) and values
     relative_differece_dict = {}
     for key, values in data.items():
@@ -207,16 +208,9 @@ def run_analyzer(knob_name):
     ax.yaxis.grid(True, color='gray', linestyle='--', linewidth=0.5)
 
     plt.subplots_adjust(bottom=0.30)
-    # Capture the current figure size in inches
-    fig_width, fig_height = fig.get_size_inches()
-
-    # Set a new size if needed
-    new_width, new_height = 22, 18  # New size in inches
-    fig.set_size_inches(new_width, new_height)
 
-    # plt.show()
-    # Save the figure as a PNG with adjusted size
-    plt.savefig(f'./correlation_analysis/{knob_name}.png', format='png', dpi=fig.dpi, bbox_inches='tight')
+    # Save the figure as a 22x18 inch PNG and free it
+    save_figure(fig, chart_path(knob_name))
 
 
 def read_json_files(directory):
@@ -262,11 +256,15 @@ if __name__ == '__main__':
     #     file.write(useless_knobs)
 
     useful_knobs = ""
+    charts = {}
     for key, value in processed_files_data.items():
         useful_knobs += key + "\n"
-        print(key)
         # Only for boolean knobs
-        run_analyzer(key)
+        charts[key] = (key, value)
+
+    # Draw the charts of all the knobs in parallel, unchanged ones are skipped
+    for key in render_charts(run_analyzer, charts):
+        print(key)
     
     # with open('useful_knobs.txt', 'a') as file:
     #     file.write(useful_knobs)
@@ -5,9 +5,14 @@ import glob
 import json
 import numpy as np
 import sys
-from scipy.stats import pearsonr
+import matplotlib
+matplotlib.use('Agg')
 import matplotlib.pyplot as plt
 import matplotlib.patches as mpatches
+from correlation import correlate_knobs, correlations_by_knob, save_correlation_table
+from render import chart_path, render_charts, save_figure
+from stats_table import has_knob_table, knob_table_values
+from probe import read_dead_knobs
 
 def generate_values(number):
     # Some Exceptional Values
@@ -170,24 +175,23 @@ def json_to_dict_with_arrays(file_path):
         result[key] = value
     return result
 
-# Helper function to run the correlation analysis
-def run_analyzer(knob_name, knob_value, converted_dict):
-    x = generate_values(convert_to_appropriate_type(knob_name, knob_value))
-    x = np.array(x)
-
-    Pearson_correlation_coefficients = []
-    P_Value = []
-    keys = []
-
-    for key, value in converted_dict.items():
-        y = np.array(value)
-        temp = set(y)
-        if len(temp) == 1:
-            continue
-        keys.append(key)
-        correlation_coefficient, p_value = pearsonr(x, y)
-        Pearson_correlation_coefficients.append(correlation_coefficient)
-        P_Value.append(p_value)
+# Title of a chart, from the values the knob was swept over
+# The step is only given when the values are evenly spaced
+def values_title(knob_name, knob_value, values):
+    values = sorted(values)
+    title = f'Correlation Analysis by Modifying {knob_name} : {knob_value} over {len(values)} values from {values[0]} to {values[-1]}'
+    steps = set(np.round(np.diff(values), 6))
+    if len(steps) == 1:
+        title += f' with increments of {steps.pop()}'
+    return title
+
+# Helper function to plot the correlation analysis of a knob
+# values are the values the knob was swept over, correlations is the knob's
+# entry of correlations_by_knob
+def run_analyzer(knob_name, knob_value, values, correlations):
+    keys = list(correlations.keys())
+    Pearson_correlation_coefficients = [correlations[key][0] for key in keys]
+    P_Value = [correlations[key][1] for key in keys]
 
     if(len(keys) == 0):
         return
@@ -203,10 +207,7 @@ def run_analyzer(knob_name, knob_value, converted_dict):
 
     ax.set_xlabel('Stats')
     ax.set_ylabel('Values')
-    if(convert_to_appropriate_type(knob_name, knob_value) < 0):
-        ax.set_title(f'Correlation Analysis by Modifying {knob_name} : {knob_value} from {x[1]} to {x[-2]} with increments of {x[2] - x[1]} and using 2 odd values {x[0]} and {x[-1]}')
-    else:
-        ax.set_title(f'Correlation Analysis by Modifying {knob_name} : {knob_value} from {x[0]} to {x[-3]} with increments of {x[1] - x[0]} and using 2 odd values {x[-2]} and {x[-1]}')
+    ax.set_title(values_title(knob_name, knob_value, values))
     ax.set_xticks(index + bar_width / 2)
     ax.set_xticklabels(keys, rotation=45, ha='right')
     ax.legend()
@@ -218,15 +219,9 @@ def run_analyzer(knob_name, knob_value, converted_dict):
     ax.yaxis.grid(True, color='gray', linestyle='--', linewidth=0.5)
 
     plt.subplots_adjust(bottom=0.30)
-    # Capture the current figure size in inches
-    fig_width, fig_height = fig.get_size_inches()
 
-    # Set a new size if needed
-    new_width, new_height = 22, 18  # New size in inches
-    fig.set_size_inches(new_width, new_height)
-
-    # Save the figure as a PNG with adjusted size
-    plt.savefig(f'./correlation_analysis/{knob_name}.png', format='png', dpi=fig.dpi, bbox_inches='tight')
+    # Save the figure as a 22x18 inch PNG and free it
+    save_figure(fig, chart_path(knob_name))
 
 
 def read_json_files(directory):
@@ -259,6 +254,9 @@ if __name__ == '__main__':
     directory_path = './Batch4_Results'
     empty_files, processed_files_data = read_json_files(directory_path)
 
+    # Knobs the probe of main.py found dead were never swept
+    empty_files += [knob_name for knob_name in read_dead_knobs() if knob_name not in empty_files]
+
     useless_knobs = ""
 
     print(Fore.RED + "Knobs that brought no change in STATS on modifying them : " + Fore.RESET)
@@ -271,12 +269,29 @@ if __name__ == '__main__':
     with open('useless_knobs.txt', 'a') as file:
         file.write(useless_knobs)
 
+    # Correlate every stat of every knob in one go
+    # The values of a knob are the ones it was swept over, which are not the fixed
+    # grid of generate_values when main.py ran with SEARCH=adaptive
+    knob_values = {}
+    for key in processed_files_data:
+        if has_knob_table(key):
+            knob_values[key] = knob_table_values(key)
+        else:
+            knob_values[key] = generate_values(convert_to_appropriate_type(key, master_stats_dict[key]))
+    correlation_table = correlate_knobs(knob_values, processed_files_data)
+    save_correlation_table(correlation_table, 'correlation_table.csv')
+    knob_correlations = correlations_by_knob(correlation_table)
+
     useful_knobs = ""
+    charts = {}
     for key, value in processed_files_data.items():
         useful_knobs += key + "\n"
+        if key in knob_correlations:
+            charts[key] = (key, master_stats_dict[key], knob_values[key], knob_correlations[key])
+
+    # Draw the charts of all the knobs in parallel, unchanged ones are skipped
+    for key in render_charts(run_analyzer, charts):
         print(key)
-        # Only for boolean knobs
-        run_analyzer(key, master_stats_dict[key], value)
     
     with open('useful_knobs.txt', 'a') as file:
         file.write(useful_knobs)
@@ -0,0 +1,60 @@
+import os
+import json
+import numpy as np
+from colorama import init, Fore
+from correlation import correlate_knobs, save_correlation_table
+from stats_table import TIMING_TABLE_DIRECTORY, aggregate_knob_table, has_knob_table
+from stat_matrix import matrix_to_dict, varying_stats_mask
+init()
+
+# Passes printed per knob, the ones whose time changes the most over the values
+NUM_HOT_SPOTS = 10
+
+RESULTS_DIRECTORY = './Timing_Results'
+
+
+# The time of every pass summed over the bitcode files and levels, per knob value
+# Every value runs the same files and levels, so the sums can be compared
+def knob_timings(knob_name):
+    values, timing_keys, value_matrix = aggregate_knob_table(knob_name, directory=TIMING_TABLE_DIRECTORY)
+    timing_matrix = value_matrix.T
+    return values, matrix_to_dict(timing_keys, timing_matrix, varying_stats_mask(timing_matrix))
+
+
+# Wall time keys whose total changes the most between the values of the knob
+def hot_spots(timings, count=NUM_HOT_SPOTS):
+    spread = {key: max(values) - min(values) for key, values in timings.items() if key.startswith('wall time us') or key.startswith('analysis wall time us')}
+    return sorted(spread, key=spread.get, reverse=True)[:count]
+
+
+if __name__ == '__main__':
+    if not os.path.exists(RESULTS_DIRECTORY):
+        os.mkdir(RESULTS_DIRECTORY)
+
+    if not os.path.exists(TIMING_TABLE_DIRECTORY):
+        print(Fore.RED + f"No timing table in {TIMING_TABLE_DIRECTORY}, run main.py with TIME_PASSES=1 first" + Fore.RESET)
+        exit(1)
+
+    knob_values = {}
+    knob_stats = {}
+
+    for knob_name in sorted(os.listdir(TIMING_TABLE_DIRECTORY)):
+        if not has_knob_table(knob_name, TIMING_TABLE_DIRECTORY):
+            continue
+
+        values, timings = knob_timings(knob_name)
+        knob_values[knob_name] = values
+        knob_stats[knob_name] = timings
+
+        with open(f'{RESULTS_DIRECTORY}/{knob_name}_timings.json', 'w') as file:
+            json.dump(timings, file)
+
+        print(Fore.BLUE + f"##  Compile time hot spots of {knob_name}" + Fore.RESET)
+        for key in hot_spots(timings):
+            times = np.array(timings[key]) / 1e6
+            print(f"{key} : {times.min():.4f}s to {times.max():.4f}s")
+
+    # Correlate the knob values with every pass time and the usage of opt
+    correlation_table = correlate_knobs(knob_values, knob_stats)
+    save_correlation_table(correlation_table, 'timing_correlation_table.csv')
+    print(Fore.GREEN + f"Saved {len(correlation_table.knob)} correlations to timing_correlation_table.csv" + Fore.RESET)
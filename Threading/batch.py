@@ -0,0 +1,121 @@
+import json
+from collections import defaultdict
+from sweep import SweepTask, line_pattern, run_sweep
+
+# Several knobs in one opt run
+# A knob only moves the stats of a few passes. Knobs whose moved stats (from the
+# probe) come from disjoint passes are set together in one opt run, and the
+# output of every knob is put back together from the stats of its own passes in
+# the batched run and the stats of all the other passes in the default run.
+# This assumes a knob does not change the stats of the passes of the other knobs
+# of its batch, which the probe only checks on a few files and at the ends of
+# the grid.
+
+# Most knobs set in one opt run
+MAX_BATCH_SIZE = 8
+
+
+# "<description> (<component>)" -> component
+def stat_component(key):
+    return key.rpartition(' (')[2][:-1]
+
+
+# Groups the knobs into batches whose passes do not overlap
+# moved_stats: {knob: set of stats} from probe_moved_stats, knobs that move no
+# stat are not batched. Knobs touching the most passes are placed first, each
+# in the first batch it fits in.
+def plan_batches(moved_stats, max_batch_size=MAX_BATCH_SIZE):
+    knob_components = {knob_name: {stat_component(key) for key in stats} for knob_name, stats in moved_stats.items() if stats}
+
+    batches = []
+    batch_components = []
+    for knob_name in sorted(knob_components, key=lambda knob_name: (-len(knob_components[knob_name]), knob_name)):
+        components = knob_components[knob_name]
+        for batch, used_components in zip(batches, batch_components):
+            if len(batch) < max_batch_size and not components & used_components:
+                batch.append(knob_name)
+                used_components |= components
+                break
+        else:
+            batches.append([knob_name])
+            batch_components.append(set(components))
+
+    return [(batch, {knob_name: knob_components[knob_name] for knob_name in batch}) for batch in batches]
+
+
+# Tasks of a batch for one (file, level)
+# The default of every knob, then one task per round setting the r-th value of
+# every knob of the batch that is not at its default. A round left with a single
+# knob is a plain task of that knob.
+def batch_tasks(batch, knob_values_dict, knob_defaults_dict, file_index, level):
+    for knob_name in batch:
+        yield SweepTask(knob_name, knob_defaults_dict[knob_name], file_index, level)
+
+    rounds = max(len(knob_values_dict[knob_name]) for knob_name in batch)
+    for r in range(rounds):
+        settings = [(knob_name, knob_values_dict[knob_name][r]) for knob_name in batch if r < len(knob_values_dict[knob_name]) and knob_values_dict[knob_name][r] != knob_defaults_dict[knob_name]]
+        if len(settings) == 1:
+            yield SweepTask(settings[0][0], settings[0][1], file_index, level)
+        elif settings:
+            knob_names, vals = zip(*settings)
+            yield SweepTask(knob_names, vals, file_index, level)
+
+
+def generate_batch_tasks(batches, knob_values_dict, knob_defaults_dict, levels, num_files):
+    for batch, _ in batches:
+        for i in range(num_files):
+            for level in levels:
+                yield from batch_tasks(batch, knob_values_dict, knob_defaults_dict, i, level)
+
+
+# The output of one knob of a batched run
+# Stats of the components of the knob come from the batched run, all the other
+# stats from the default run
+def attribute_output(batched_output, default_output, components, stats_mode='text'):
+    if stats_mode == 'json':
+        record = {key: count for key, count in json.loads(default_output).items() if stat_component(key) not in components}
+        record.update({key: count for key, count in json.loads(batched_output).items() if stat_component(key) in components})
+        return json.dumps(record)
+
+    def stats_lines(output):
+        return [line for line in output.splitlines() if line_pattern.match(line)]
+
+    lines = [line for line in stats_lines(default_output) if line_pattern.match(line).group(2) not in components]
+    lines += [line for line in stats_lines(batched_output) if line_pattern.match(line).group(2) in components]
+    # opt groups the report by component
+    lines.sort(key=lambda line: line_pattern.match(line).group(2))
+
+    return ''.join(line + '\n' for line in lines)
+
+
+# Runs the knobs of knob_values_dict batch by batch and yields (task, output) for
+# every (knob, value, file, level) as run_sweep would
+# Batched runs are stored in the result store under the tuples of their knobs and
+# values, the outputs of every knob are rebuilt from them on every run.
+def run_batched_sweep(batches, knob_values_dict, knob_defaults_dict, backend, levels, num_files, num_workers=None, baseline_cache=None, result_store=None):
+    component_of_knob = {}
+    for _, knob_components in batches:
+        component_of_knob.update(knob_components)
+
+    default_outputs = {}
+    # (file, level) -> batched runs waiting for the default run
+    pending_outputs = defaultdict(list)
+
+    def attributed(task, output, default_output):
+        for knob_name, val in zip(task.knob_name, task.val):
+            yield SweepTask(knob_name, val, task.file_index, task.level), attribute_output(output, default_output, component_of_knob[knob_name], backend.stats_mode)
+
+    tasks = generate_batch_tasks(batches, knob_values_dict, knob_defaults_dict, levels, num_files)
+    for task, output in run_sweep(tasks, backend, num_workers, knob_defaults_dict, baseline_cache, result_store):
+        key = (task.file_index, task.level)
+
+        if not isinstance(task.knob_name, tuple):
+            if task.val == knob_defaults_dict[task.knob_name] and key not in default_outputs:
+                default_outputs[key] = output
+                for pending_task, pending_output in pending_outputs.pop(key, []):
+                    yield from attributed(pending_task, pending_output, output)
+            yield task, output
+        elif key in default_outputs:
+            yield from attributed(task, output, default_outputs[key])
+        else:
+            pending_outputs[key].append((task, output))
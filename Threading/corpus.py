@@ -0,0 +1,179 @@
+from colorama import init, Fore
+init()
+import os
+import sys
+import json
+import hashlib
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from store import atomic_write
+from sweep import OPT_PATH
+
+# Local copy of the ComPile modules the experiments run on
+# Every driver folder sits next to this one, so ./../corpus is shared by all of them.
+# <directory>/bitcode/<sha256>.bc   one file per distinct module, named after the
+#                                  hash of its bytes in the dataset
+# <directory>/manifest.json        the hash of every module in dataset order
+CORPUS_DIRECTORY = './../corpus'
+DATASET = 'llvm-ml/ComPile'
+DATASET_SPLIT = 'train'
+CORPUS_SIZE = 1000
+
+# Where the validation tools are taken from, the bin directory of opt by default
+LLVM_BIN = os.path.dirname(OPT_PATH)
+
+# Optional check of every new module, VALIDATE=bcanalyzer or VALIDATE=verify
+# bcanalyzer: llvm-bcanalyzer can read the bitcode
+# verify: opt can read the bitcode and the module passes the IR verifier
+VALIDATORS = {
+    'bcanalyzer': ['llvm-bcanalyzer'],
+    'verify': ['opt', '-passes=verify', '-disable-output'],
+}
+
+# The manifest is saved every this many new modules, so an interrupted
+# download only loses the last few
+MANIFEST_SAVE_INTERVAL = 100
+
+
+def corpus_directory():
+    return os.environ.get('CORPUS_DIR', CORPUS_DIRECTORY)
+
+
+def manifest_path(directory):
+    return os.path.join(directory, 'manifest.json')
+
+
+def module_path(digest, directory):
+    return os.path.join(directory, 'bitcode', f'{digest}.bc')
+
+
+def load_manifest(directory):
+    try:
+        with open(manifest_path(directory), 'r') as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {'dataset': DATASET, 'split': DATASET_SPLIT, 'modules': []}
+
+
+def save_manifest(manifest, directory):
+    atomic_write(manifest_path(directory), json.dumps(manifest, indent=4))
+
+
+def validate_module(file_path, validator, llvm_bin=LLVM_BIN):
+    tool, *flags = VALIDATORS[validator]
+    command_vector = [os.path.join(llvm_bin, tool)] + flags + [file_path]
+    return subprocess.run(command_vector, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL).returncode == 0
+
+
+def usable_modules(modules):
+    return [module for module in modules if module.get('valid', True)]
+
+
+# Downloads modules of the dataset into the corpus until it holds count usable ones
+# The bitcode of the dataset is written as is, modules already in the manifest
+# are not downloaded again and a module seen before is only written once.
+# With a validator every new module is checked on a pool of num_workers
+# threads while the download goes on, and marked "valid" in the manifest.
+# Every module that fails is replaced by the next one of the dataset.
+def materialize_corpus(count=CORPUS_SIZE, directory=None, validator=None, llvm_bin=LLVM_BIN, num_workers=None):
+    if directory is None:
+        directory = corpus_directory()
+    if num_workers is None:
+        num_workers = int(os.environ.get('NUM_WORKERS', os.cpu_count() or 1))
+
+    manifest = load_manifest(directory)
+    modules = manifest['modules']
+
+    with ThreadPoolExecutor(max_workers=num_workers) as executor:
+        # digest -> future validating it
+        validations = {}
+
+        # Modules stored by an earlier run without validation
+        if validator is not None:
+            for module in modules:
+                if 'valid' not in module and module['sha256'] not in validations:
+                    validations[module['sha256']] = executor.submit(validate_module, module_path(module['sha256'], directory), validator, llvm_bin)
+
+        while True:
+            for module in modules:
+                if 'valid' not in module and module['sha256'] in validations:
+                    module['valid'] = validations[module['sha256']].result()
+                    if not module['valid']:
+                        print(Fore.RED + f"Module {module['index']} ({module['sha256']}) failed {validator}" + Fore.RESET)
+
+            missing = count - len(usable_modules(modules))
+            if missing <= 0:
+                break
+
+            from datasets import load_dataset
+
+            ds = load_dataset(DATASET, split=DATASET_SPLIT, streaming=True).skip(len(modules))
+
+            start = len(modules)
+            for index, row in zip(range(start, start + missing), ds):
+                bitcode_module = row['content']
+                digest = hashlib.sha256(bitcode_module).hexdigest()
+
+                output_path = module_path(digest, directory)
+                if not os.path.exists(output_path):
+                    atomic_write(output_path, bitcode_module)
+
+                if validator is not None and digest not in validations:
+                    validations[digest] = executor.submit(validate_module, output_path, validator, llvm_bin)
+
+                modules.append({'index': index, 'sha256': digest, 'size': len(bitcode_module)})
+                if len(modules) % MANIFEST_SAVE_INTERVAL == 0:
+                    save_manifest(manifest, directory)
+
+                print(Fore.CYAN + f"Stored module {index}" + Fore.RESET)
+
+            if len(modules) == start:
+                print(Fore.RED + f"The dataset has no more modules, the corpus has {len(usable_modules(modules))} usable ones" + Fore.RESET)
+                break
+
+    save_manifest(manifest, directory)
+    return manifest
+
+
+# Paths of the first count modules of the corpus, in dataset order
+def corpus_modules(count=CORPUS_SIZE, directory=None):
+    if directory is None:
+        directory = corpus_directory()
+
+    # Modules that failed validation are left out
+    modules = usable_modules(load_manifest(directory)['modules'])
+    if len(modules) < count:
+        print(Fore.RED + f"The corpus in {directory} has {len(modules)} usable modules, {count} are needed. Run python corpus.py in ./Threading first." + Fore.RESET)
+        sys.exit(1)
+
+    return [module_path(module['sha256'], directory) for module in modules[:count]]
+
+
+# Links ./bitcode/test_<i + 1>.bc to the i-th module of the corpus for the
+# drivers that read a bitcode directory
+def link_bitcode_directory(count, bitcode_directory, directory=None):
+    os.makedirs(bitcode_directory, exist_ok=True)
+
+    for index, path in enumerate(corpus_modules(count, directory)):
+        link_path = os.path.join(bitcode_directory, f'test_{index + 1}.bc')
+        if os.path.lexists(link_path):
+            os.unlink(link_path)
+        os.symlink(os.path.relpath(path, bitcode_directory), link_path)
+
+
+if __name__ == "__main__":
+    count = int(os.environ.get('CORPUS_SIZE', CORPUS_SIZE))
+    llvm_bin = os.environ.get('LLVM_BIN', LLVM_BIN)
+    validator = os.environ.get('VALIDATE')
+    if validator is not None and validator not in VALIDATORS:
+        print(Fore.RED + f"Unknown validator {validator}, expected one of {', '.join(VALIDATORS)}" + Fore.RESET)
+        sys.exit(1)
+
+    manifest = materialize_corpus(count, validator=validator, llvm_bin=llvm_bin)
+    distinct = len(set(module['sha256'] for module in manifest['modules']))
+    print(Fore.GREEN + f"{len(manifest['modules'])} modules in {corpus_directory()}, {distinct} distinct" + Fore.RESET)
+
+    # BITCODE_DIR=./bitcode also fills a bitcode directory with test_<i>.bc links
+    bitcode_directory = os.environ.get('BITCODE_DIR')
+    if bitcode_directory:
+        link_bitcode_directory(count, bitcode_directory)
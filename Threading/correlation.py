@@ -0,0 +1,91 @@
+import csv
+from collections import namedtuple
+import numpy as np
+from scipy.special import stdtr
+from scipy.stats import rankdata
+
+# One row per (knob, stat), every other field is a column
+CorrelationTable = namedtuple('CorrelationTable', ['knob', 'stat', 'n', 'pearson', 'pearson_p', 'spearman', 'spearman_p'])
+
+CORRELATION_COLUMNS = list(CorrelationTable._fields)
+
+
+# Row wise Pearson coefficient of the rows of x and y, both (rows x n)
+# Rows where either side is constant get nan, like pearsonr
+def rowwise_pearson(x, y):
+    x = x - x.mean(axis=1, keepdims=True)
+    y = y - y.mean(axis=1, keepdims=True)
+    denominator = np.sqrt((x * x).sum(axis=1) * (y * y).sum(axis=1))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        r = (x * y).sum(axis=1) / denominator
+    return np.clip(r, -1.0, 1.0)
+
+
+# Two sided p-value of r for samples of size n, from the t distribution
+# with n - 2 degrees of freedom, the test pearsonr and spearmanr use
+def correlation_p_value(r, n):
+    df = n - 2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = r * np.sqrt(df / ((1.0 - r) * (1.0 + r)))
+    p = 2 * stdtr(df, -np.abs(t))
+    return np.where(np.abs(r) == 1.0, 0.0, p)
+
+
+# Pearson and Spearman of every row of y against the matching row of x
+def rowwise_correlation(x, y):
+    n = x.shape[1]
+    pearson = rowwise_pearson(x, y)
+    spearman = rowwise_pearson(rankdata(x, axis=1), rankdata(y, axis=1))
+    return pearson, correlation_p_value(pearson, n), spearman, correlation_p_value(spearman, n)
+
+
+# Batched correlation of a whole batch of knobs
+# knob_values: {knob: values the knob was swept over}
+# knob_stats: {knob: {stat: [count per value]}}
+# Stats that never change are left out, like in run_analyzer. All the rows
+# with the same number of values are correlated in a single vectorized pass.
+def correlate_knobs(knob_values, knob_stats):
+    rows_by_length = {}
+
+    for knob_name, stats in knob_stats.items():
+        x = np.asarray(knob_values[knob_name], dtype=np.float64)
+        for stat, counts in stats.items():
+            if len(counts) != len(x) or len(set(counts)) == 1:
+                continue
+            rows = rows_by_length.setdefault(len(x), ([], [], [], []))
+            rows[0].append(knob_name)
+            rows[1].append(stat)
+            rows[2].append(x)
+            rows[3].append(counts)
+
+    columns = {column: [] for column in CORRELATION_COLUMNS}
+
+    for n, (knobs, stats, x, y) in rows_by_length.items():
+        if n < 3:
+            continue
+        pearson, pearson_p, spearman, spearman_p = rowwise_correlation(np.array(x), np.array(y, dtype=np.float64))
+        columns['knob'] += knobs
+        columns['stat'] += stats
+        columns['n'] += [n] * len(knobs)
+        columns['pearson'] += pearson.tolist()
+        columns['pearson_p'] += pearson_p.tolist()
+        columns['spearman'] += spearman.tolist()
+        columns['spearman_p'] += spearman_p.tolist()
+
+    return CorrelationTable(**columns)
+
+
+# {knob: {stat: (pearson, pearson_p, spearman, spearman_p)}}, the stats of
+# a knob keep the order they were given in
+def correlations_by_knob(table):
+    by_knob = {}
+    for knob_name, stat, _, pearson, pearson_p, spearman, spearman_p in zip(*table):
+        by_knob.setdefault(knob_name, {})[stat] = (pearson, pearson_p, spearman, spearman_p)
+    return by_knob
+
+
+def save_correlation_table(table, file_path):
+    with open(file_path, 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(CORRELATION_COLUMNS)
+        writer.writerows(zip(*table))
@@ -1,9 +1,92 @@
 import os
+from concurrent.futures import ThreadPoolExecutor
 from PIL import Image
 from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import letter
+from reportlab.lib.utils import ImageReader
 
-def combine_images_to_pdf(input_folder, output_pdf):
+# Resolution of the images in the PDF, set REPORT_DPI=0 to keep the full size of the charts
+REPORT_DPI = 100
+
+# Pages decoded ahead of the one being written, per worker
+PAGES_PER_WORKER = 2
+
+
+# Size and offset of an image of the given size fit and centered on the page
+def fit_to_page(img_width, img_height, page_size=letter):
+    width, height = page_size
+    aspect_ratio = img_width / img_height
+    new_width = width
+    new_height = width / aspect_ratio
+
+    if new_height > height:
+        new_height = height
+        new_width = height * aspect_ratio
+
+    x_offset = (width - new_width) / 2
+    y_offset = (height - new_height) / 2
+
+    return x_offset, y_offset, new_width, new_height
+
+
+# Decodes an image once and scales it down to about dpi pixels per inch of the page,
+# never less
+def load_page_image(image_path, dpi=REPORT_DPI, page_size=letter):
+    img = Image.open(image_path)
+    # Convert the image to RGB if it's in a different mode (e.g., RGBA)
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+
+    if dpi:
+        _, _, new_width, _ = fit_to_page(*img.size, page_size)
+        # The page is measured in points, 72 per inch. Charts are only shrunk by
+        # whole factors, averaging boxes of pixels keeps the flat colors of a
+        # chart which compress far better than a resampled image.
+        factor = int(img.size[0] // (new_width / 72 * dpi))
+        if factor >= 2:
+            img = img.reduce(factor)
+
+    return img
+
+
+# Streaming PDF report, one page per image
+# Pages are added as soon as they are given, the decoded image is handed
+# straight to reportlab so it is not read from disk a second time
+class ReportBuilder:
+    def __init__(self, output_pdf, page_size=letter):
+        self.output_pdf = output_pdf
+        self.page_size = page_size
+        self.canvas = canvas.Canvas(output_pdf, pagesize=page_size)
+        self.num_pages = 0
+
+    def add_image(self, img):
+        x_offset, y_offset, new_width, new_height = fit_to_page(*img.size, self.page_size)
+        self.canvas.drawImage(ImageReader(img), x_offset, y_offset, new_width, new_height)
+        self.canvas.showPage()  # Add a new page in the PDF for each image
+        self.num_pages += 1
+
+    def save(self):
+        self.canvas.save()
+
+
+# Decodes the images on a pool of threads, a few pages ahead of the writer,
+# and yields them in order
+def decoded_images(image_paths, dpi=REPORT_DPI, num_workers=None):
+    if num_workers is None:
+        num_workers = int(os.environ.get('NUM_WORKERS', os.cpu_count() or 1))
+
+    window = num_workers * PAGES_PER_WORKER
+    with ThreadPoolExecutor(max_workers=num_workers) as executor:
+        pending = []
+        for image_path in image_paths:
+            pending.append(executor.submit(load_page_image, image_path, dpi))
+            if len(pending) >= window:
+                yield pending.pop(0).result()
+        for future in pending:
+            yield future.result()
+
+
+def combine_images_to_pdf(input_folder, output_pdf, dpi=REPORT_DPI, num_workers=None):
     # Get all PNG files in the folder
     png_files = [f for f in os.listdir(input_folder) if f.lower().endswith('.png')]
     png_files.sort()  # Optional: sort files alphabetically
@@ -13,39 +96,16 @@ def combine_images_to_pdf(input_folder, output_pdf):
         print("No PNG files found in the folder.")
         return
 
-    # Create a new PDF with ReportLab
-    c = canvas.Canvas(output_pdf, pagesize=letter)
-    width, height = letter  # Default PDF page size (8.5 x 11 inches)
-
-    for png_file in png_files:
-        image_path = os.path.join(input_folder, png_file)
-        # Open the image
-        img = Image.open(image_path)
-        # Convert the image to RGB if it's in a different mode (e.g., RGBA)
-        if img.mode != 'RGB':
-            img = img.convert('RGB')
-
-        # Calculate the image dimensions to fit into the PDF page size
-        img_width, img_height = img.size
-        aspect_ratio = img_width / img_height
-        new_width = width
-        new_height = width / aspect_ratio
-
-        if new_height > height:
-            new_height = height
-            new_width = height * aspect_ratio
-
-        x_offset = (width - new_width) / 2
-        y_offset = (height - new_height) / 2
-
-        # Add the image to the PDF
-        c.drawImage(image_path, x_offset, y_offset, new_width, new_height)
-        c.showPage()  # Add a new page in the PDF for each image
+    report = ReportBuilder(output_pdf)
+    image_paths = [os.path.join(input_folder, png_file) for png_file in png_files]
+    for img in decoded_images(image_paths, dpi, num_workers):
+        report.add_image(img)
 
-    c.save()  # Save the PDF
+    report.save()  # Save the PDF
     print(f"PDF saved as {output_pdf}")
 
 if __name__ == "__main__":
     input_folder = "./correlation_analysis"  # Replace with the path to your folder
     output_pdf = "result.pdf"  # Replace with the desired output PDF name
-    combine_images_to_pdf(input_folder, output_pdf)
+    dpi = int(os.environ.get('REPORT_DPI', REPORT_DPI))
+    combine_images_to_pdf(input_folder, output_pdf, dpi)
@@ -0,0 +1,93 @@
+import re
+from bisect import bisect_right
+
+# Resolves the string identifier and cl::init value of the knobs of a
+# prelim_knobs.txt file from the LLVM sources
+# Every source file is read and indexed once: each declaration of the form
+# Name("identifier", ..., cl::init(value), ...); is recorded at the line of
+# Name, so resolving all the knobs of a file is one pass over it.
+
+# Lines after the line of a knob its name may be found on
+LINE_WINDOW = 10
+
+DECLARATION_PATTERN = re.compile(r'(\w+)\s*\(\s*"([^"]+)"')
+
+INIT_PATTERN = re.compile(r'cl::init\s*\(\s*([^)]+)\s*\)')
+
+# {file_path: {line_number: {name: (string identifier, init value)}}}
+_indexes = {}
+
+
+# End of the statement starting at start, the first ';' outside of
+# parentheses and string literals
+def statement_end(text, start):
+    depth = 0
+    in_string = False
+    i = start
+    while i < len(text):
+        c = text[i]
+        if in_string:
+            if c == '\\':
+                i += 1
+            elif c == '"':
+                in_string = False
+        elif c == '"':
+            in_string = True
+        elif c == '(':
+            depth += 1
+        elif c == ')':
+            depth -= 1
+        elif c == ';' and depth <= 0:
+            return i
+        i += 1
+
+    return len(text)
+
+
+def index_source(file_path):
+    with open(file_path, 'r') as file:
+        lines = file.readlines()
+
+    # The file as one line, so that a declaration split over lines is one match
+    stripped = [line.strip() + ' ' for line in lines]
+    line_starts = []
+    offset = 0
+    for line in stripped:
+        line_starts.append(offset)
+        offset += len(line)
+    text = ''.join(stripped)
+
+    index = {}
+    for match in DECLARATION_PATTERN.finditer(text):
+        declaration = text[match.start():statement_end(text, match.start())]
+        init_match = INIT_PATTERN.search(declaration)
+        if not init_match:
+            continue
+
+        line_number = bisect_right(line_starts, match.start(1))
+        index.setdefault(line_number, {})[match.group(1)] = (match.group(2), init_match.group(1).strip())
+
+    return index
+
+
+def source_index(file_path):
+    if file_path not in _indexes:
+        _indexes[file_path] = index_source(file_path)
+
+    return _indexes[file_path]
+
+
+# {'string_identifier': ..., 'init_value': ...} of the knob declared as name at
+# line_number of the file, or on one of the LINE_WINDOW lines after it, None if
+# there is no such cl::opt declaration with a cl::init
+def resolve_knob(file_path, line_number, name):
+    index = source_index(file_path)
+    for line in range(line_number, line_number + LINE_WINDOW + 1):
+        if name in index.get(line, {}):
+            string_identifier, init_value = index[line][name]
+            return {
+                'string_identifier': string_identifier,
+                'init_value': init_value
+            }
+
+    return None
@@ -0,0 +1,217 @@
+import os
+import sys
+import json
+import inspect
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from colorama import Fore
+from sweep import OPT_LEVELS, OptRunError, SweepTask, bitcode_path, default_num_workers, knob_flags, parse_stats_json, selected_levels
+from stat_descriptions import stat_descriptions
+
+# Persistent opt workers on the LLVM of llvmlite
+# Every worker process sets up LLVM once and keeps the bitcode modules it parsed.
+# A configuration is run in a fork of the worker: the child sets the knob with
+# the cl::opt parser, runs the new pass manager pipeline of the level on its copy
+# of the module and writes the -stats-json report when LLVM shuts down, so no
+# process is started and no bitcode is parsed again for it.
+# The stats come from the LLVM llvmlite is built on, not from the opt build of
+# OPT_PATH, so the knobs must exist in that version and the results are not
+# comparable with a SubprocessBackend sweep. Linux only (fork).
+
+# Parsed modules kept by every worker
+MODULE_CACHE_SIZE = 16
+
+# (speed level, size level) of the default pipeline of each level, PLAIN runs no pass
+# Os and Oz are the O2 pipeline with size level 1 and 2, as in opt
+PIPELINE_LEVELS = {
+    'PLAIN': None,
+    'O1': (1, 0),
+    'O2': (2, 0),
+    'O3': (3, 0),
+    'Os': (2, 1),
+    'Oz': (2, 2),
+}
+
+# State of a worker process
+_llvm = None
+_target_machine = None
+_descriptions = {}
+_modules = {}
+
+
+def import_llvmlite():
+    try:
+        import llvmlite.binding as llvm
+    except ImportError:
+        print(Fore.RED + "BACKEND=llvmlite needs llvmlite, pip install llvmlite" + Fore.RESET)
+        sys.exit(1)
+    return llvm
+
+
+# Whether the installed llvmlite builds size pipelines
+# create_pipeline_tuning_options only takes a size_level in some releases
+def has_size_levels(llvm):
+    return 'size_level' in inspect.signature(llvm.create_pipeline_tuning_options).parameters
+
+
+# The levels of the sweep the installed llvmlite can run
+# Without size levels Os and Oz are left out of the default levels, and an
+# error when LEVELS asks for them
+def llvmlite_levels(levels):
+    if has_size_levels(import_llvmlite()):
+        return levels
+
+    size_levels = [level for level in levels if PIPELINE_LEVELS.get(level) is not None and PIPELINE_LEVELS[level][1] != 0]
+    if not size_levels:
+        return levels
+
+    if os.environ.get('LEVELS'):
+        print(Fore.RED + f"This llvmlite has no size pipelines, it cannot run {', '.join(size_levels)}" + Fore.RESET)
+        sys.exit(1)
+
+    print(Fore.YELLOW + f"This llvmlite has no size pipelines, {', '.join(size_levels)} are left out" + Fore.RESET)
+    return [level for level in levels if level not in size_levels]
+
+
+def init_worker(descriptions):
+    global _llvm, _target_machine, _descriptions
+    _descriptions = descriptions
+    _llvm = import_llvmlite()
+    _llvm.initialize_native_target()
+    _llvm.initialize_native_asmprinter()
+    _target_machine = _llvm.Target.from_default_triple().create_target_machine()
+
+
+def parsed_module(file_path):
+    if file_path not in _modules:
+        if len(_modules) >= MODULE_CACHE_SIZE:
+            # Oldest first, the sweep goes through the files in order
+            del _modules[next(iter(_modules))]
+        with open(file_path, 'rb') as file:
+            _modules[file_path] = _llvm.parse_bitcode(file.read())
+
+    return _modules[file_path]
+
+
+# Runs in the forked child, never returns
+def run_configuration(module, options, level, info_path):
+    status = 1
+    try:
+        for option in options + ['-stats', '-stats-json', f'-info-output-file={info_path}']:
+            _llvm.set_option('opt', option)
+
+        if PIPELINE_LEVELS[level] is not None:
+            speed_level, size_level = PIPELINE_LEVELS[level]
+            if has_size_levels(_llvm):
+                tuning_options = _llvm.create_pipeline_tuning_options(speed_level=speed_level, size_level=size_level)
+            else:
+                tuning_options = _llvm.create_pipeline_tuning_options(speed_level=speed_level)
+            pass_builder = _llvm.create_pass_builder(_target_machine, tuning_options)
+            pass_builder.getModulePassManager().run(module, pass_builder)
+
+        # The stats are printed when LLVM shuts down
+        _llvm.shutdown()
+        status = 0
+    finally:
+        os._exit(status)
+
+
+# Runs one configuration in a worker and returns its record as JSON, like run_opt_json
+# Raises OptRunError when the child does not exit cleanly
+def run_in_worker(file_path, options, level):
+    module = parsed_module(file_path)
+
+    fd, info_path = tempfile.mkstemp(suffix='.json')
+    os.close(fd)
+    try:
+        pid = os.fork()
+        if pid == 0:
+            run_configuration(module, options, level, info_path)
+        _, status = os.waitpid(pid, 0)
+
+        with open(info_path, 'r') as file:
+            stats_json = file.read()
+    finally:
+        os.unlink(info_path)
+
+    returncode = os.waitstatus_to_exitcode(status)
+    if returncode != 0:
+        raise OptRunError(['llvmlite', level] + options + [file_path], returncode, json.dumps({}))
+
+    if not stats_json.strip():
+        return json.dumps({})
+
+    return json.dumps(parse_stats_json(stats_json, _descriptions))
+
+
+# Same interface as SubprocessBackend, always with json stats
+# opt_path is the llvmlite library, so the baseline cache and the result store
+# key its runs on the LLVM that made them.
+class LlvmliteBackend:
+    def __init__(self, levels, num_workers=None):
+        llvm = import_llvmlite()
+        for level in levels:
+            if level not in PIPELINE_LEVELS:
+                print(Fore.RED + f"BACKEND=llvmlite cannot run {level}, use LEVELS={','.join(PIPELINE_LEVELS)}" + Fore.RESET)
+                sys.exit(1)
+            if PIPELINE_LEVELS[level] is not None and PIPELINE_LEVELS[level][1] != 0 and not has_size_levels(llvm):
+                print(Fore.RED + f"This llvmlite has no size pipelines, it cannot run {level}" + Fore.RESET)
+                sys.exit(1)
+
+        self.opt_path = os.path.join(os.path.dirname(llvm.ffi.__file__), llvm.ffi.get_library_name())
+        self.stats_mode = 'json'
+        self.time_passes = False
+        self.time_trace = False
+        self.output_kind = 'llvmlite-' + '.'.join(map(str, llvm.llvm_version_info)) + '-json+descriptions'
+        # Read from STATS_SOURCE_DIRECTORY, which should hold the LLVM of llvmlite
+        self.stat_descriptions = stat_descriptions(self.opt_path)
+
+        if num_workers is None:
+            num_workers = default_num_workers()
+        # Workers are started fresh, forking the sweep with its threads is not safe
+        self.executor = ProcessPoolExecutor(max_workers=num_workers, mp_context=multiprocessing.get_context('spawn'), initializer=init_worker, initargs=(self.stat_descriptions,))
+
+        self.check_stats(levels, '.'.join(map(str, llvm.llvm_version_info)))
+
+    # Smoke run of the first bitcode file at the first level with a pipeline, before
+    # any work is queued. The LLVM of an llvmlite built without LLVM_ENABLE_STATS
+    # never counts anything, every run of the sweep would look the same.
+    def check_stats(self, levels, llvm_version):
+        pipeline_levels = [level for level in levels if PIPELINE_LEVELS[level] is not None]
+        if not pipeline_levels:
+            return
+
+        level = pipeline_levels[0]
+        file_path = bitcode_path(0)
+        if not os.path.isfile(file_path):
+            print(Fore.RED + f"BACKEND=llvmlite checks its stats on {file_path}, which is missing" + Fore.RESET)
+            sys.exit(1)
+
+        try:
+            output = self.executor.submit(run_in_worker, os.path.abspath(file_path), [], level).result()
+        except OptRunError as error:
+            print(Fore.RED + f"The llvmlite smoke run failed: {error}" + Fore.RESET)
+            sys.exit(1)
+
+        if not json.loads(output):
+            print(Fore.RED + f"llvmlite (LLVM {llvm_version}) reported no stats for {level} on {file_path}. Its LLVM is built without LLVM_ENABLE_STATS, BACKEND=llvmlite needs an llvmlite built on an LLVM with LLVM_ENABLE_STATS=ON or assertions enabled" + Fore.RESET)
+            sys.exit(1)
+
+    def flags(self, task, with_knob=True):
+        flags = knob_flags(task) if with_knob else []
+        return flags + OPT_LEVELS[task.level] + ['-stats', '-stats-json']
+
+    def run(self, task, with_knob=True):
+        options = knob_flags(task) if with_knob else []
+        return self.executor.submit(run_in_worker, os.path.abspath(bitcode_path(task.file_index)), options, task.level).result()
+
+
+# Smoke run, python llvmlite_backend.py runs ./bitcode/test_1.bc at every level of
+# LEVELS that the installed llvmlite can run and prints how many stats each gave
+if __name__ == "__main__":
+    levels = llvmlite_levels(selected_levels())
+    backend = LlvmliteBackend(levels, 1)
+    for level in levels:
+        output = backend.run(SweepTask(None, None, 0, level), with_knob=False)
+        print(Fore.GREEN + f"{level}: {len(json.loads(output))} stats" + Fore.RESET)
@@ -1,10 +1,17 @@
 import sys
 import os
-import subprocess
 import re
-import threading
+from collections import defaultdict
 # from datasets import load_dataset
 from colorama import init, Fore, Back, Style
+from sweep import OPT_PATH, SubprocessBackend, SweepTask, default_num_workers, format_stats_block, gather_levels, output_record, run_sweep, selected_levels, split_timed_output, stats_file_name
+from store import BaselineCache, ResultStore, atomic_write
+from stats_table import TIMING_TABLE_DIRECTORY, StatsTableWriter
+from search import search_knob_values
+from probe import probe_files, probe_moved_stats, write_dead_knobs
+from batch import MAX_BATCH_SIZE, plan_batches, run_batched_sweep
+from llvmlite_backend import LlvmliteBackend, llvmlite_levels
+from knob_source import resolve_knob
 init()
 
 def convert_to_appropriate_type_main(data):
@@ -23,45 +30,6 @@ def convert_to_appropriate_type_main(data):
     except ValueError:
         pass
 
-# This Function reads a given set of lines from the cpp file
-# The starting line and 10 lines ahead of it
-
-
-def read_lines_around(file_path, start_line, num_lines=10):
-    lines = []
-    with open(file_path, 'r') as file:
-        for i, line in enumerate(file):
-            if start_line - 1 <= i <= start_line + num_lines:
-                lines.append(line)
-            if i > start_line + num_lines:
-                break
-    return lines
-
-# This Function extracts the string identifier and the init value
-# from the snippet
-
-
-def extract_init_value_and_string(snippet, function_name):
-    pattern = rf'{function_name}\s*\(\s*"([^"]+)"(?:.*?)cl::init\s*\(\s*([^)]+)\s*\)'
-
-    match = re.search(pattern, snippet, re.DOTALL)
-    if match:
-        return {
-            'string_identifier': match.group(1),
-            'init_value': match.group(2)
-        }
-    else:
-        return None
-
-# This Function processes the input lines, ie. take care of newlines
-
-
-def process_multiline_from_file(file_path, line_number, function_name):
-    lines = read_lines_around(file_path, line_number)
-    snippet = ''.join(line.strip() for line in lines)
-    snippet = snippet.replace(';', ';\n')
-    return extract_init_value_and_string(snippet, function_name)
-
 # this function converts the knob information from the sheet
 # Into useful information that can be used to study them
 
@@ -93,6 +61,7 @@ def process_file(file_path):
     return extracted_data
 
 # Function to get init val and its identifier from the cpp file
+# Every cpp file is indexed once, see knob_source.py
 
 
 def get_identifier_and_init_val(extracted_data):
@@ -102,8 +71,7 @@ def get_identifier_and_init_val(extracted_data):
         file_path = "./../../dev/llvm-project/" + entry['file_path']
         line_number = int(entry['line_number'])
         function_name = entry['function_name']
-        data = process_multiline_from_file(
-            file_path, line_number, function_name)
+        data = resolve_knob(file_path, line_number, function_name)
         if data:
             result_dict[data['string_identifier']] = (data['init_value'])
         else:
@@ -250,107 +218,107 @@ def convert_to_appropriate_type(data, s):
     print(Fore.RED + f"Invalid value: {data} set to {s}" + Fore.RESET)
     exit(0)
 
-def split_dict(input_dict, chunk_size):
-    items = list(input_dict.items())
-    return [dict(items[i:i + chunk_size]) for i in range(0, len(items), chunk_size)]
-
-def thread_function(result_dict):
-    iteration = 0
-    index = 1
+# Number of bitcode files in ./bitcode that every knob value is run on
+NUM_FILES = 100
 
-    for i in range(100):
-        iteration = iteration + 1
-        for result in result_dict:
-            
-            knob_name = result
+# Writes ./directories/{knob}.txt and the stats directories of the values of a knob
+def write_knob_directories(knob_name, values):
+    with open(f'./directories/{knob_name}.txt', 'w') as file:
+        for val in values:
+            file.write(f"./stats/{knob_name}_{val}\n")
 
-            value = str(convert_to_appropriate_type_main({'string_identifier': result, 'init_value': result_dict[result]}))
+    for val in values:
+        directory_name = f"{knob_name}_{val}"
 
-            if value is not None:
-                value = convert_to_appropriate_type(knob_name, value)
-                print(Fore.GREEN + f"Value Set: {value}" + Fore.RESET)
-            else:
-                print(Fore.RED + "No Value found for knob" + Fore.RESET)
-                sys.exit(1)
+        if not os.path.exists(f"./stats/{directory_name}"):
+            os.mkdir(f"./stats/{directory_name}")
 
-            values = generate_values(value)
-
-            if i == 0:
-                with open(f'./directories/{knob_name}.txt', 'w') as file:
-                    pass
-                for val in values:
-                    with open(f'./directories/{knob_name}.txt', 'a') as file:
-                        file.write(f"./stats/{knob_name}_{val}\n")
+# Returns the default value of every knob
+def parse_knob_defaults(result_dict):
+    knob_defaults_dict = {}
 
-                    directory_name = f"{knob_name}_{val}"
+    for result in result_dict:
+        knob_name = result
 
-                    if not os.path.exists(f"./stats/{directory_name}"):
-                        os.mkdir(f"./stats/{directory_name}")
+        value = str(convert_to_appropriate_type_main({'string_identifier': result, 'init_value': result_dict[result]}))
 
-            for val in values:
-
-                opt_command_vector = [
-                    './../../dev/llvm-project/build/bin/opt', f'-{knob_name}={val}', '-stats', f'./bitcode/test_{(i+1)}.bc']
-                opt_O1_command_vector = [
-                    './../../dev/llvm-project/build/bin/opt', f'-{knob_name}={val}', '-O1', '-stats', f'./bitcode/test_{(i+1)}.bc']
-                opt_O2_command_vector = [
-                    './../../dev/llvm-project/build/bin/opt', f'-{knob_name}={val}', '-O2', '-stats', f'./bitcode/test_{(i+1)}.bc']
-                opt_O3_command_vector = [
-                    './../../dev/llvm-project/build/bin/opt', f'-{knob_name}={val}', '-O3', '-stats', f'./bitcode/test_{(i+1)}.bc']
-                opt_Os_command_vector = [
-                    './../../dev/llvm-project/build/bin/opt', f'-{knob_name}={val}', '-Os', '-stats', f'./bitcode/test_{(i+1)}.bc']
-                opt_Oz_command_vector = [
-                    './../../dev/llvm-project/build/bin/opt', f'-{knob_name}={val}', '-Oz', '-stats', f'./bitcode/test_{(i+1)}.bc']
+        if value is not None:
+            value = convert_to_appropriate_type(knob_name, value)
+            print(Fore.GREEN + f"Value Set: {value}" + Fore.RESET)
+        else:
+            print(Fore.RED + "No Value found for knob" + Fore.RESET)
+            sys.exit(1)
 
-                output_string = ""
-                output_string += "PLAIN STATS> \n"
-                with subprocess.Popen(opt_command_vector, stdout=subprocess.PIPE, stderr=subprocess.PIPE) as opt_process:
-                    _, stderr_data = opt_process.communicate()
+        knob_defaults_dict[knob_name] = value
 
-                    output_string += str(stderr_data)[222:-1]
+    return knob_defaults_dict
 
-                output_string += "O1 STATS> \n"
-                with subprocess.Popen(opt_O1_command_vector, stdout=subprocess.PIPE, stderr=subprocess.PIPE) as opt_O1_process:
-                    _, stderr_data = opt_O1_process.communicate()
+# Returns the values each knob is swept over
+# values_function(knob_name, default) gives the values of a knob, the fixed grid by default
+def generate_knob_values(knob_defaults_dict, values_function=None):
+    knob_values_dict = {}
 
-                    output_string += str(stderr_data)[222:-1]
+    for knob_name, value in knob_defaults_dict.items():
+        if values_function is None:
+            values = generate_values(value)
+        else:
+            values = values_function(knob_name, value)
 
-                output_string += "O2 STATS> \n"
-                with subprocess.Popen(opt_O2_command_vector, stdout=subprocess.PIPE, stderr=subprocess.PIPE) as opt_O2_process:
-                    _, stderr_data = opt_O2_process.communicate()
+        write_knob_directories(knob_name, values)
 
-                    output_string += str(stderr_data)[222:-1]
+        knob_values_dict[knob_name] = values
 
-                output_string += "O3 STATS> \n"
-                with subprocess.Popen(opt_O3_command_vector, stdout=subprocess.PIPE, stderr=subprocess.PIPE) as opt_O3_process:
-                    _, stderr_data = opt_O3_process.communicate()
+    return knob_values_dict
 
-                    output_string += str(stderr_data)[222:-1]
+# Every (knob, value, file, level) opt invocation is its own task
+# Knobs are the outermost loop so that only a few stats files are
+# being filled up at any time
+def generate_tasks(knob_values_dict, levels):
+    for knob_name, values in knob_values_dict.items():
+        for i in range(NUM_FILES):
+            for val in values:
+                for level in levels:
+                    yield SweepTask(knob_name, val, i, level)
 
-                output_string += "Os STATS> \n"
-                with subprocess.Popen(opt_Os_command_vector, stdout=subprocess.PIPE, stderr=subprocess.PIPE) as opt_Os_process:
-                    _, stderr_data = opt_Os_process.communicate()
+# 10 bitcode files go in each stats file, stats_1.txt to stats_10.txt
+FILES_PER_STATS_FILE = 10
 
-                    output_string += str(stderr_data)[222:-1]
+def stats_index(file_index):
+    return file_index // FILES_PER_STATS_FILE + 1
 
-                output_string += "Oz STATS> \n"
-                with subprocess.Popen(opt_Oz_command_vector, stdout=subprocess.PIPE, stderr=subprocess.PIPE) as opt_Oz_process:
-                    _, stderr_data = opt_Oz_process.communicate()
+def files_in_stats_file(index):
+    return min(FILES_PER_STATS_FILE, NUM_FILES - (index - 1) * FILES_PER_STATS_FILE)
 
-                    output_string += str(stderr_data)[222:-1]
+# Holds the outputs of a stats file until all of its bitcode files are done
+# and then writes it in one go, so a resumed sweep rewrites the file
+# instead of appending the same records twice
+def write_stats(pending_stats, knob_name, val, file_index, output_string, stats_mode='text'):
+    index = stats_index(file_index)
+    key = (knob_name, val, index)
+    pending_stats[key].append((file_index, output_string))
 
-                output_string = output_string.replace('\\n', '\n')
+    if len(pending_stats[key]) < files_in_stats_file(index):
+        return
 
-                print(iteration, index)
+    stats_string = ""
+    for i, output_string in sorted(pending_stats.pop(key)):
+        stats_string += format_stats_block(i, output_string, stats_mode)
 
-                with open(f'./stats/{knob_name}_{val}/stats_{index}.txt', 'a') as f:
-                    f.write(f"====================================  STATS FOR FILE : {i} ====================================\n")
-                    f.write(output_string)
+    atomic_write(f'./stats/{knob_name}_{val}/{stats_file_name(index, stats_mode)}', stats_string)
 
-                print(Fore.CYAN + f"Wrote Stats for knob {knob_name} with value {val} for Iteration {i}" + Fore.RESET)
+# Adds every result to the columnar stats table on its way to the stats files
+def write_table(results, table_writer, stats_mode='text'):
+    for task, output in results:
+        table_writer.add(task, output_record(output, stats_mode))
+        yield task, output
 
-        if (iteration % 10 == 0):
-            index += 1
+# Takes the timings out of the results of a -time-passes sweep and adds them to the
+# timing table, the stats go on as if the sweep ran without -time-passes
+def write_timings(results, timing_writer):
+    for task, output in results:
+        stats_output, timings = split_timed_output(output)
+        timing_writer.add(task, timings)
+        yield task, stats_output
 
 if __name__ == "__main__":
     if not os.path.exists("stats"):
@@ -365,27 +333,94 @@ if __name__ == "__main__":
 
     result_dict = get_identifier_and_init_val(knob_data)
 
-    chunk_size = 1
-    split_dicts = split_dict(result_dict, chunk_size)
+    num_workers = int(os.environ.get('NUM_WORKERS', default_num_workers()))
 
-    Thread_name = "THREAD"
+    levels = selected_levels()
 
-    Thread_array = []
+    # TIME_PASSES=1 also collects the time of every pass, TIME_TRACE=1 keeps a -time-trace of every run
+    # BACKEND=llvmlite runs the sweep in persistent llvmlite workers instead of one opt process per run
+    if os.environ.get('BACKEND', 'subprocess') == 'llvmlite':
+        if os.environ.get('TIME_PASSES') == '1' or os.environ.get('TIME_TRACE') == '1':
+            print(Fore.RED + "BACKEND=llvmlite does not collect timings, run it without TIME_PASSES=1 and TIME_TRACE=1" + Fore.RESET)
+            sys.exit(1)
+        levels = llvmlite_levels(levels)
+        backend = LlvmliteBackend(levels, num_workers)
+    else:
+        backend = SubprocessBackend(OPT_PATH, time_passes=os.environ.get('TIME_PASSES') == '1', time_trace=os.environ.get('TIME_TRACE') == '1')
+
+    print(Fore.GREEN + f"##  Running levels {', '.join(levels)} on {num_workers} workers with {backend.stats_mode} stats" + Fore.RESET)
+
+    # The default value of every knob is the same opt run, so it is only done once
+    baseline_cache = BaselineCache(backend.opt_path)
+
+    # Everything already run is read back from here, so the sweep can be resumed
+    result_store = ResultStore(backend.opt_path)
+
+    knob_defaults_dict = parse_knob_defaults(result_dict)
+
+    # Knobs that do not change any stat at the ends of their grid on a few files are
+    # left out of the sweep, PROBE=0 sweeps every knob
+    # PROBE_CONFIRM=1 runs the dead knobs again on all the files before dropping them
+    moved_stats = None
+    if os.environ.get('PROBE', '1') == '1':
+        grid_values_dict = {knob_name: generate_values(default) for knob_name, default in knob_defaults_dict.items()}
+        moved_stats = probe_moved_stats(grid_values_dict, knob_defaults_dict, backend, levels, probe_files(NUM_FILES), num_workers, baseline_cache, result_store)
+        dead_knobs = [knob_name for knob_name, stats in moved_stats.items() if not stats]
+
+        if dead_knobs and os.environ.get('PROBE_CONFIRM') == '1':
+            dead_grid_values_dict = {knob_name: grid_values_dict[knob_name] for knob_name in dead_knobs}
+            moved_stats.update(probe_moved_stats(dead_grid_values_dict, knob_defaults_dict, backend, levels, range(NUM_FILES), num_workers, baseline_cache, result_store))
+            dead_knobs = [knob_name for knob_name in dead_knobs if not moved_stats[knob_name]]
+
+        write_dead_knobs(dead_knobs)
+        for knob_name in dead_knobs:
+            del knob_defaults_dict[knob_name]
+            # A stale list from an earlier run would make analyze.py look for the knob
+            if os.path.exists(f'./directories/{knob_name}.txt'):
+                os.remove(f'./directories/{knob_name}.txt')
+
+        print(Fore.GREEN + f"##  Probe found {len(dead_knobs)} dead knobs, sweeping {len(knob_defaults_dict)}" + Fore.RESET)
+
+    # SEARCH=adaptive bisects the fixed grid where the stats change on the probe files
+    # instead of running all of it, and only sweeps the values around the changes
+    if os.environ.get('SEARCH') == 'adaptive':
+        def search_values(knob_name, default):
+            values = search_knob_values(knob_name, generate_values(default), default, backend, levels, probe_files(NUM_FILES), num_workers, baseline_cache, result_store)
+            print(Fore.GREEN + f"##  Searched {knob_name} over {len(values)} values" + Fore.RESET)
+            return values
+
+        knob_values_dict = generate_knob_values(knob_defaults_dict, search_values)
+    else:
+        knob_values_dict = generate_knob_values(knob_defaults_dict)
 
-    for i, d in enumerate(split_dicts):
-        Thread_to_use = Thread_name + str((i+1))
-        Thread_to_use = threading.Thread(target=thread_function, args=(d,))
-        Thread_array.append(Thread_to_use)
-    
-    for i in range(len(Thread_array)):
-        Thread_array[i].start()
+    # BATCH=1 sets knobs that move the stats of different passes in the same opt run
+    if os.environ.get('BATCH') == '1':
+        if moved_stats is None or backend.time_passes:
+            print(Fore.RED + "BATCH=1 needs the probe and cannot split pass timings between knobs, run it without PROBE=0 and TIME_PASSES=1" + Fore.RESET)
+            sys.exit(1)
+
+        batches = plan_batches({knob_name: moved_stats[knob_name] for knob_name in knob_values_dict}, int(os.environ.get('BATCH_SIZE', MAX_BATCH_SIZE)))
+        print(Fore.GREEN + f"##  Sweeping {len(knob_values_dict)} knobs in {len(batches)} batches" + Fore.RESET)
+        results = run_batched_sweep(batches, knob_values_dict, knob_defaults_dict, backend, levels, NUM_FILES, num_workers, baseline_cache, result_store)
+    else:
+        results = run_sweep(generate_tasks(knob_values_dict, levels), backend, num_workers, defaults=knob_defaults_dict, baseline_cache=baseline_cache, result_store=result_store)
+
+    if backend.time_passes:
+        timing_writer = StatsTableWriter(knob_values_dict, levels, NUM_FILES, TIMING_TABLE_DIRECTORY)
+        results = write_timings(results, timing_writer)
+
+    table_writer = StatsTableWriter(knob_values_dict, levels, NUM_FILES)
+    results = write_table(results, table_writer, backend.stats_mode)
 
-    print(Fore.GREEN + f"##  Successfully started all threads" + Fore.RESET)
+    pending_stats = defaultdict(list)
 
-    for i in range(len(Thread_array)):
-        Thread_array[i].join()
+    for knob_name, val, file_index, output_string in gather_levels(results, levels, backend.stats_mode):
+        write_stats(pending_stats, knob_name, val, file_index, output_string, backend.stats_mode)
+        print(Fore.CYAN + f"Wrote Stats for knob {knob_name} with value {val} for Iteration {file_index}" + Fore.RESET)
 
     os.system("python analyze.py")
+    if backend.time_passes:
+        os.system("python analyze_timings.py")
     print(Fore.GREEN + f"##  Successfully analyzed All Knobs" + Fore.RESET)
 
     sys.exit(0)
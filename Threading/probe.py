@@ -0,0 +1,68 @@
+from sweep import SweepTask, output_record, run_sweep, split_timed_output
+
+# Cheap check for knobs that do not change any stat
+# A knob is run at the two ends of its values on a few bitcode files and
+# compared with the default runs, which come from the baseline cache. Knobs
+# that give the same stats as the default everywhere are dead and can be left
+# out of the sweep.
+
+# Bitcode files the probe runs on, spread over all the files
+PROBE_FILES = 5
+
+DEAD_KNOBS_FILE = 'dead_knobs.txt'
+
+
+def probe_files(num_files, count=PROBE_FILES):
+    step = max(1, num_files // count)
+    return list(range(0, num_files, step))[:count]
+
+
+def probe_tasks(knob_values_dict, knob_defaults_dict, levels, files):
+    for knob_name, values in knob_values_dict.items():
+        default = knob_defaults_dict[knob_name]
+        for val in sorted({min(values), max(values), default}):
+            for i in files:
+                for level in levels:
+                    yield SweepTask(knob_name, val, i, level)
+
+
+# Returns the stats each knob moves away from their value at its default on the
+# probed (file, level) runs, {knob: set of stats}, empty for a dead knob
+def probe_moved_stats(knob_values_dict, knob_defaults_dict, backend, levels, files, num_workers=None, baseline_cache=None, result_store=None):
+    default_records = {}
+    value_records = []
+
+    tasks = probe_tasks(knob_values_dict, knob_defaults_dict, levels, files)
+    for task, output in run_sweep(tasks, backend, num_workers, knob_defaults_dict, baseline_cache, result_store):
+        if backend.time_passes:
+            output = split_timed_output(output)[0]
+        # A stat at 0 is the same as a missing stat
+        record = {key: count for key, count in output_record(output, backend.stats_mode).items() if count != 0}
+
+        if task.val == knob_defaults_dict[task.knob_name]:
+            default_records[(task.knob_name, task.file_index, task.level)] = record
+        else:
+            value_records.append((task, record))
+
+    moved_stats = {knob_name: set() for knob_name in knob_values_dict}
+    for task, record in value_records:
+        default_record = default_records[(task.knob_name, task.file_index, task.level)]
+        for key in record.keys() | default_record.keys():
+            if record.get(key, 0) != default_record.get(key, 0):
+                moved_stats[task.knob_name].add(key)
+
+    return moved_stats
+
+
+def write_dead_knobs(dead_knobs, file_path=DEAD_KNOBS_FILE):
+    with open(file_path, 'w') as file:
+        for knob_name in dead_knobs:
+            file.write(knob_name + "\n")
+
+
+def read_dead_knobs(file_path=DEAD_KNOBS_FILE):
+    try:
+        with open(file_path, 'r') as file:
+            return [line.strip() for line in file if line.strip()]
+    except FileNotFoundError:
+        return []
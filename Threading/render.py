@@ -0,0 +1,86 @@
+import os
+import sys
+import json
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+from colorama import Fore
+from store import atomic_write, content_key, file_digest
+
+CHART_DIRECTORY = './correlation_analysis'
+
+# Charts drawn by a worker process before it is replaced by a fresh one,
+# so whatever matplotlib keeps around between figures cannot pile up
+CHARTS_PER_WORKER = 50
+
+
+def chart_path(knob_name, directory=CHART_DIRECTORY):
+    return os.path.join(directory, f'{knob_name}.png')
+
+
+def manifest_path(directory=CHART_DIRECTORY):
+    return os.path.join(directory, 'manifest.json')
+
+
+def load_manifest(directory=CHART_DIRECTORY):
+    try:
+        with open(manifest_path(directory), 'r') as file:
+            return json.load(file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+# Key of a chart, the hash of the script that draws it and of its input
+# Editing the plotting code or getting new data redraws the chart
+def chart_key(plot_function, args):
+    script_path = sys.modules[plot_function.__module__].__file__
+    return content_key(file_digest(script_path), plot_function.__name__, json.dumps(args, sort_keys=True, default=str))
+
+
+# Saves a figure with the size every correlation chart uses and closes it
+def save_figure(fig, file_path):
+    fig.set_size_inches(22, 18)
+    fig.savefig(file_path, format='png', dpi=fig.dpi, bbox_inches='tight')
+    plt.close(fig)
+
+
+# Rendering stage of the analyze scripts
+# jobs: {knob: args}, plot_function(*args) draws and saves the chart of a knob.
+# Charts are drawn on the Agg backend by a pool of processes, and a chart whose
+# input has not changed since the last run (see manifest.json) is not redrawn.
+# Returns the knobs that were drawn.
+def render_charts(plot_function, jobs, num_workers=None, directory=CHART_DIRECTORY):
+    if num_workers is None:
+        num_workers = int(os.environ.get('NUM_WORKERS', os.cpu_count() or 1))
+
+    os.makedirs(directory, exist_ok=True)
+    manifest = load_manifest(directory)
+
+    keys = {}
+    for knob_name, args in jobs.items():
+        key = chart_key(plot_function, args)
+        if manifest.get(knob_name) == key and os.path.exists(chart_path(knob_name, directory)):
+            continue
+        keys[knob_name] = key
+
+    if not keys:
+        return []
+
+    rendered = []
+    try:
+        with ProcessPoolExecutor(max_workers=num_workers, max_tasks_per_child=CHARTS_PER_WORKER) as executor:
+            futures = {executor.submit(plot_function, *jobs[knob_name]): knob_name for knob_name in keys}
+            for future in as_completed(futures):
+                knob_name = futures[future]
+                try:
+                    future.result()
+                except Exception as error:
+                    print(Fore.RED + f"Could not draw the chart of {knob_name}: {error}" + Fore.RESET)
+                    continue
+                manifest[knob_name] = keys[knob_name]
+                rendered.append(knob_name)
+    finally:
+        atomic_write(manifest_path(directory), json.dumps(manifest, indent=4))
+
+    return rendered
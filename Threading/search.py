@@ -0,0 +1,121 @@
+from collections import defaultdict
+from sweep import SweepTask, output_record, run_sweep, split_timed_output
+
+# Adaptive choice of the values a knob is swept over
+# Most knobs change the stats at one or two thresholds only, so instead of the
+# whole fixed grid of generate_values the search starts from a coarse part of it
+# and only bisects the intervals where some stat changes between the two ends,
+# until every such interval is no wider than the resolution. The bisection runs
+# on a few bitcode files only (the files of the probe), and only the values on
+# either side of a change, the ends of the grid and the default are kept for
+# the sweep over all the files.
+
+# Every this many points of the fixed grid go in the coarse grid
+COARSE_GRID_STEP = 3
+
+# Breakpoints are located to this share of the range of the grid
+SEARCH_RESOLUTION = 0.01
+
+# Most values run on the search files for a single knob, as a share of the size
+# of its grid, a knob changing at many thresholds stops here
+SEARCH_BUDGET = 1.0
+
+# Most values kept for the sweep over all the files, as a share of the size of
+# the grid, so a knob never costs more than three quarters of its fixed grid
+SWEEP_BUDGET = 0.75
+
+
+# Every third value of the fixed grid, its last value and the default
+def coarse_grid(grid_values, default):
+    return sorted(set(grid_values[::COARSE_GRID_STEP] + [grid_values[-1], default]))
+
+
+def default_resolution(grid_values):
+    resolution = (max(grid_values) - min(grid_values)) * SEARCH_RESOLUTION
+    if all(isinstance(val, int) for val in grid_values):
+        return max(1, int(resolution))
+    return resolution if resolution > 0 else SEARCH_RESOLUTION
+
+
+def budget(grid_values, share):
+    return max(1, int(len(grid_values) * share))
+
+
+def midpoint(low, high):
+    if isinstance(low, int) and isinstance(high, int):
+        return (low + high) // 2
+    return (low + high) / 2
+
+
+# Sum of the stats of a knob value over the given bitcode files and the levels,
+# {val: {stat: count}} for every value
+def evaluate_values(knob_name, values, backend, levels, files, num_workers=None, default=None, baseline_cache=None, result_store=None):
+    tasks = [SweepTask(knob_name, val, i, level) for val in values for i in files for level in levels]
+    defaults = {knob_name: default} if default is not None else {}
+
+    totals = {val: defaultdict(int) for val in values}
+    for task, output in run_sweep(tasks, backend, num_workers, defaults, baseline_cache, result_store):
+        if backend.time_passes:
+            output = split_timed_output(output)[0]
+        for key, count in output_record(output, backend.stats_mode).items():
+            totals[task.val][key] += count
+
+    # A stat at 0 is the same as a missing stat
+    return {val: {key: count for key, count in stats.items() if count != 0} for val, stats in totals.items()}
+
+
+# The values kept for the sweep over all the files
+# The ends of the grid and the default, then the two ends of every interval where
+# the stats change, the intervals where most stats change first
+def kept_values(evaluated, grid_values, default):
+    kept = {min(grid_values), max(grid_values), default}
+    limit = max(len(kept), budget(grid_values, SWEEP_BUDGET))
+
+    values = sorted(evaluated)
+    changes = []
+    for low, high in zip(values, values[1:]):
+        moved = sum(1 for key in evaluated[low].keys() | evaluated[high].keys() if evaluated[low].get(key, 0) != evaluated[high].get(key, 0))
+        if moved:
+            changes.append((moved, low, high))
+
+    for _, low, high in sorted(changes, key=lambda change: -change[0]):
+        if len(kept | {low, high}) > limit:
+            continue
+        kept |= {low, high}
+
+    return sorted(kept)
+
+
+# Searches the values of a knob on the given bitcode files, see above
+# Every round evaluates the midpoints of all the intervals still to split in one
+# sweep, so the workers stay busy. Returns the sorted values kept for the sweep.
+# Runs go through the result store, so sweeping the returned values afterwards
+# does not run opt again on the search files.
+def search_knob_values(knob_name, grid_values, default, backend, levels, files, num_workers=None, baseline_cache=None, result_store=None, resolution=None, tracked_stats=None):
+    if resolution is None:
+        resolution = default_resolution(grid_values)
+    max_values = budget(grid_values, SEARCH_BUDGET)
+
+    def stats_of(stats):
+        if tracked_stats is None:
+            return stats
+        return {key: count for key, count in stats.items() if key in tracked_stats}
+
+    evaluated = {}
+    new_values = coarse_grid(grid_values, default)
+
+    while new_values and len(evaluated) < max_values:
+        new_values = new_values[:max_values - len(evaluated)]
+        for val, stats in evaluate_values(knob_name, new_values, backend, levels, files, num_workers, default, baseline_cache, result_store).items():
+            evaluated[val] = stats_of(stats)
+
+        values = sorted(evaluated)
+        new_values = []
+        for low, high in zip(values, values[1:]):
+            if evaluated[low] == evaluated[high] or high - low <= resolution:
+                continue
+            mid = midpoint(low, high)
+            if mid not in evaluated and low < mid < high:
+                new_values.append(mid)
+
+    return kept_values(evaluated, grid_values, default)
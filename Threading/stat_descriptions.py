@@ -0,0 +1,95 @@
+import os
+import re
+import sys
+import json
+from colorama import Fore
+from store import CACHE_DIRECTORY, ContentStore, content_key, file_digest
+
+# Descriptions of the LLVM statistics, for the json stats mode
+# -stats-json names a stat "<DEBUG_TYPE>.<Variable>" while the text report, the
+# stats_*.txt lists and analyze.py use "<description> (<DEBUG_TYPE>)". The
+# description of every stat is read from the STATISTIC(Variable, "description")
+# declarations of the LLVM sources, with the DEBUG_TYPE defined above it in the
+# same file. The map is built once per opt binary and kept in the cache.
+
+STATS_SOURCE_DIRECTORY = './../../dev/llvm-project/llvm'
+
+SOURCE_SUBDIRECTORIES = ['lib', 'include']
+
+SOURCE_EXTENSIONS = ('.cpp', '.h', '.inc', '.def')
+
+# #define DEBUG_TYPE "instcombine", or #define DEBUG_TYPE LV_NAME with LV_NAME
+# defined as a string in the same file
+define_pattern = re.compile(r'^\s*#\s*define\s+(\w+)\s+(?:"([^"]*)"|(\w+))\s*$', re.MULTILINE)
+
+statistic_pattern = re.compile(r'\b(?:ALWAYS_ENABLED_)?STATISTIC\s*\(\s*(\w+)\s*,\s*((?:"(?:[^"\\]|\\.)*"\s*)+)\)')
+
+string_pattern = re.compile(r'"((?:[^"\\]|\\.)*)"')
+
+
+# {"<DEBUG_TYPE>.<Variable>": description} of the statistics of one source file
+# A statistic above any DEBUG_TYPE of its file takes it from a header, it is left out
+def parse_statistics(text):
+    events = []
+    strings = {}
+    for match in define_pattern.finditer(text):
+        if match.group(2) is not None:
+            strings[match.group(1)] = match.group(2)
+        if match.group(1) == 'DEBUG_TYPE':
+            events.append((match.start(), match.group(2) if match.group(2) is not None else strings.get(match.group(3))))
+
+    descriptions = {}
+    for match in statistic_pattern.finditer(text):
+        debug_type = None
+        for position, value in events:
+            if position > match.start():
+                break
+            debug_type = value
+        if debug_type is None:
+            continue
+
+        # "a" "b" is one string, \" and \\ are the only escapes used
+        description = ''.join(string_pattern.findall(match.group(2)))
+        description = description.replace('\\"', '"').replace('\\\\', '\\')
+        descriptions.setdefault(f'{debug_type}.{match.group(1)}', description)
+
+    return descriptions
+
+
+def scan_statistics(source_directory):
+    descriptions = {}
+    for subdirectory in SOURCE_SUBDIRECTORIES:
+        for root, _, files in os.walk(os.path.join(source_directory, subdirectory)):
+            for name in sorted(files):
+                if not name.endswith(SOURCE_EXTENSIONS):
+                    continue
+                with open(os.path.join(root, name), 'r', errors='replace') as file:
+                    text = file.read()
+                if 'STATISTIC' not in text:
+                    continue
+                for key, description in parse_statistics(text).items():
+                    descriptions.setdefault(key, description)
+
+    return descriptions
+
+
+# The map of the LLVM opt_path was built from, read from the cache when it is there
+def stat_descriptions(opt_path, source_directory=STATS_SOURCE_DIRECTORY):
+    cache = ContentStore(f'{CACHE_DIRECTORY}/stat_descriptions')
+    key = content_key(file_digest(opt_path), 'stat-descriptions')
+
+    cached = cache.get(key)
+    if cached is not None:
+        return json.loads(cached)
+
+    if not os.path.isdir(source_directory):
+        print(Fore.RED + f"STATS_MODE=json needs the LLVM sources in {source_directory} to name the stats like the text report" + Fore.RESET)
+        sys.exit(1)
+
+    descriptions = scan_statistics(source_directory)
+    if not descriptions:
+        print(Fore.RED + f"No STATISTIC declarations found in {source_directory}" + Fore.RESET)
+        sys.exit(1)
+
+    cache.put(key, json.dumps(descriptions, sort_keys=True))
+    return descriptions
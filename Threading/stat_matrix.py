@@ -0,0 +1,48 @@
+import numpy as np
+
+# Merge engine for the analyze scripts
+# Turns one {stat: count} dict per knob value into a dense (stat x value)
+# matrix, a stat that is missing for a value counts as 0
+
+
+# Index of every stat key, in the order the keys are first seen
+def build_stat_index(stats_dicts):
+    stat_index = {}
+    for stats_dict in stats_dicts:
+        for key in stats_dict:
+            if key not in stat_index:
+                stat_index[key] = len(stat_index)
+    return stat_index
+
+
+# Returns the stat keys and the (stat x value) matrix of counts
+def merge_stat_dicts(stats_dicts):
+    stat_index = build_stat_index(stats_dicts)
+    matrix = np.zeros((len(stat_index), len(stats_dicts)), dtype=np.int64)
+
+    for idx, stats_dict in enumerate(stats_dicts):
+        rows = np.fromiter((stat_index[key] for key in stats_dict), dtype=np.intp, count=len(stats_dict))
+        matrix[rows, idx] = np.fromiter(stats_dict.values(), dtype=np.int64, count=len(stats_dict))
+
+    return list(stat_index), matrix
+
+
+# Same as len(set(values)) > 1 for every row
+def varying_stats_mask(matrix):
+    if matrix.shape[1] == 0:
+        return np.zeros(matrix.shape[0], dtype=bool)
+    return matrix.max(axis=1) != matrix.min(axis=1)
+
+
+# Rows where some value is further than threshold away from the mean of the row
+def spread_stats_mask(matrix, threshold):
+    if matrix.shape[1] == 0:
+        return np.zeros(matrix.shape[0], dtype=bool)
+    return np.any(np.abs(matrix - matrix.mean(axis=1, keepdims=True)) > threshold, axis=1)
+
+
+# Back to the {stat: [count per value]} dict the scripts save as JSON
+def matrix_to_dict(stat_keys, matrix, mask=None):
+    if mask is None:
+        mask = np.ones(len(stat_keys), dtype=bool)
+    return {key: matrix[idx].tolist() for idx, key in enumerate(stat_keys) if mask[idx]}
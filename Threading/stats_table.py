@@ -0,0 +1,126 @@
+import os
+import json
+import shutil
+from collections import defaultdict
+import numpy as np
+
+TABLE_DIRECTORY = './table'
+
+# Same layout for the per pass times of a -time-passes sweep, the counts
+# are microseconds and KB instead of stat counts
+TIMING_TABLE_DIRECTORY = './timing_table'
+
+# Columns of the stats table, one row per (value, bitcode file, level, stat)
+# The knob is the partition, every knob gets its own ./table/<knob>/ directory
+# with one .npy file per column. value, level and stat are ids into the
+# values.json, levels.json and stat_keys.json lists of that directory.
+COLUMNS = {
+    'value_id': np.int16,
+    'bitcode_id': np.int32,
+    'level_id': np.int8,
+    'stat_id': np.int32,
+    'count': np.int64,
+}
+
+
+# Collects the records of the sweep and writes the table of a knob
+# as soon as every task of that knob is done
+class StatsTableWriter:
+    def __init__(self, knob_values_dict, levels, num_files, directory=TABLE_DIRECTORY):
+        self.directory = directory
+        self.levels = list(levels)
+        self.values = {knob_name: list(values) for knob_name, values in knob_values_dict.items()}
+        self.expected_tasks = {knob_name: len(values) * len(self.levels) * num_files for knob_name, values in knob_values_dict.items()}
+        self.done_tasks = defaultdict(int)
+        self.rows = defaultdict(lambda: {column: [] for column in COLUMNS})
+        self.stat_ids = defaultdict(dict)
+
+    def add(self, task, record):
+        rows = self.rows[task.knob_name]
+        stat_ids = self.stat_ids[task.knob_name]
+        value_id = self.values[task.knob_name].index(task.val)
+        level_id = self.levels.index(task.level)
+
+        for key, count in record.items():
+            if key not in stat_ids:
+                stat_ids[key] = len(stat_ids)
+            rows['value_id'].append(value_id)
+            rows['bitcode_id'].append(task.file_index)
+            rows['level_id'].append(level_id)
+            rows['stat_id'].append(stat_ids[key])
+            rows['count'].append(count)
+
+        self.done_tasks[task.knob_name] += 1
+        if self.done_tasks[task.knob_name] == self.expected_tasks[task.knob_name]:
+            self.write(task.knob_name)
+
+    def write(self, knob_name):
+        rows = self.rows.pop(knob_name)
+        stat_ids = self.stat_ids.pop(knob_name)
+
+        knob_directory = os.path.join(self.directory, knob_name)
+        temp_directory = knob_directory + '.tmp'
+        if os.path.exists(temp_directory):
+            shutil.rmtree(temp_directory)
+        os.makedirs(temp_directory)
+
+        for column, dtype in COLUMNS.items():
+            np.save(os.path.join(temp_directory, f'{column}.npy'), np.array(rows[column], dtype=dtype))
+
+        with open(os.path.join(temp_directory, 'values.json'), 'w') as file:
+            json.dump(self.values[knob_name], file)
+        with open(os.path.join(temp_directory, 'levels.json'), 'w') as file:
+            json.dump(self.levels, file)
+        with open(os.path.join(temp_directory, 'stat_keys.json'), 'w') as file:
+            json.dump(list(stat_ids), file)
+
+        # Swap the finished table in, a killed run leaves the old one untouched
+        if os.path.exists(knob_directory):
+            shutil.rmtree(knob_directory)
+        os.rename(temp_directory, knob_directory)
+
+
+def has_knob_table(knob_name, directory=TABLE_DIRECTORY):
+    return os.path.exists(os.path.join(directory, knob_name, 'stat_keys.json'))
+
+
+# The values the knob was swept over, in table order
+def knob_table_values(knob_name, directory=TABLE_DIRECTORY):
+    with open(os.path.join(directory, knob_name, 'values.json'), 'r') as file:
+        return json.load(file)
+
+
+def load_knob_table(knob_name, directory=TABLE_DIRECTORY):
+    knob_directory = os.path.join(directory, knob_name)
+
+    columns = {column: np.load(os.path.join(knob_directory, f'{column}.npy'), mmap_mode='r') for column in COLUMNS}
+
+    with open(os.path.join(knob_directory, 'values.json'), 'r') as file:
+        values = json.load(file)
+    with open(os.path.join(knob_directory, 'levels.json'), 'r') as file:
+        levels = json.load(file)
+    with open(os.path.join(knob_directory, 'stat_keys.json'), 'r') as file:
+        stat_keys = json.load(file)
+
+    return columns, values, levels, stat_keys
+
+
+# Group by (value, stat) and sum the counts over bitcode files and levels
+# Only the given levels are summed if levels is set
+# Returns the values, the stat keys and a (value x stat) matrix of totals
+def aggregate_knob_table(knob_name, levels=None, directory=TABLE_DIRECTORY):
+    columns, values, table_levels, stat_keys = load_knob_table(knob_name, directory)
+
+    value_ids = columns['value_id'].astype(np.int64)
+    stat_ids = columns['stat_id'].astype(np.int64)
+    counts = columns['count']
+
+    if levels is not None:
+        level_ids = [table_levels.index(level) for level in levels if level in table_levels]
+        mask = np.isin(columns['level_id'], level_ids)
+        value_ids, stat_ids, counts = value_ids[mask], stat_ids[mask], counts[mask]
+
+    num_values, num_stats = len(values), len(stat_keys)
+    totals = np.bincount(value_ids * num_stats + stat_ids, weights=counts, minlength=num_values * num_stats)
+
+    return values, stat_keys, totals.astype(np.int64).reshape(num_values, num_stats)
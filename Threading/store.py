@@ -0,0 +1,127 @@
+import os
+import json
+import hashlib
+import tempfile
+import threading
+
+CACHE_DIRECTORY = './cache'
+
+# Digests of files we already hashed, keyed on (path, size, mtime)
+# so that opt and the bitcode files are only read once per run
+_file_digests = {}
+_file_digests_lock = threading.Lock()
+
+
+def file_digest(file_path):
+    stat = os.stat(file_path)
+    key = (os.path.realpath(file_path), stat.st_size, stat.st_mtime_ns)
+
+    with _file_digests_lock:
+        if key in _file_digests:
+            return _file_digests[key]
+
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1 << 20), b''):
+            digest.update(chunk)
+
+    with _file_digests_lock:
+        _file_digests[key] = digest.hexdigest()
+
+    return _file_digests[key]
+
+
+def content_key(*parts):
+    return hashlib.sha256(json.dumps(parts).encode('utf-8')).hexdigest()
+
+
+# Writes to a temporary file next to the target and renames it into place
+# so that a killed run never leaves a half written entry behind
+# data is written as text, or as is when it is bytes
+def atomic_write(file_path, data):
+    directory = os.path.dirname(file_path)
+    os.makedirs(directory, exist_ok=True)
+
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb' if isinstance(data, bytes) else 'w') as file:
+            file.write(data)
+        os.replace(temp_path, file_path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+# Directory of opt outputs named after the hash of what produced them
+class ContentStore:
+    def __init__(self, directory):
+        self.directory = directory
+
+    def path(self, key):
+        return os.path.join(self.directory, key[:2], f'{key}.txt')
+
+    def get(self, key):
+        try:
+            with open(self.path(key), 'r') as file:
+                return file.read()
+        except FileNotFoundError:
+            return None
+
+    def put(self, key, output):
+        atomic_write(self.path(key), output)
+
+
+# Cache of opt runs without any knob set
+# The sweep always includes the default value of a knob, which gives the same
+# stats for every knob, so it is stored once per
+# (opt binary, bitcode file, optimization level, flags) and reused.
+# Note: this assumes passing a knob at its default is the same as not passing
+# it, which is not true for the few knobs that check getNumOccurrences().
+class BaselineCache(ContentStore):
+    def __init__(self, opt_path, directory=f'{CACHE_DIRECTORY}/baseline'):
+        super().__init__(directory)
+        self.opt_path = opt_path
+
+    # output_kind is what the output holds, as for the ResultStore
+    def key(self, bitcode_path, level, flags, output_kind=None):
+        parts = [file_digest(self.opt_path), file_digest(bitcode_path), level, list(flags)]
+        if output_kind is not None:
+            parts.append(output_kind)
+        return content_key(*parts)
+
+
+# Every opt run of the sweep, keyed on (opt binary, knob, value, level, bitcode file)
+# and what the output holds (the stats mode, and the timings with -time-passes),
+# since text, json and timed runs store different outputs
+# Entries are written atomically, so a killed sweep can be restarted and only
+# runs what is not stored yet.
+# A run that did not exit cleanly is kept as <key>.failed with its exit status
+# and output. get returns that output, so a restarted sweep does not run it
+# again, unless retry_failed is set (RETRY_FAILED=1 by default).
+class ResultStore(ContentStore):
+    def __init__(self, opt_path, directory=f'{CACHE_DIRECTORY}/results', retry_failed=None):
+        super().__init__(directory)
+        self.opt_path = opt_path
+        if retry_failed is None:
+            retry_failed = os.environ.get('RETRY_FAILED') == '1'
+        self.retry_failed = retry_failed
+
+    def key(self, knob_name, val, level, bitcode_path, output_kind='text+decoded'):
+        return content_key(file_digest(self.opt_path), knob_name, val, level, file_digest(bitcode_path), output_kind)
+
+    def failure_path(self, key):
+        return os.path.join(self.directory, key[:2], f'{key}.failed')
+
+    def get(self, key):
+        output = super().get(key)
+        if output is not None or self.retry_failed:
+            return output
+
+        try:
+            with open(self.failure_path(key), 'r') as file:
+                return json.load(file)['output']
+        except FileNotFoundError:
+            return None
+
+    def put_failure(self, key, returncode, output):
+        atomic_write(self.failure_path(key), json.dumps({'returncode': returncode, 'output': output}))
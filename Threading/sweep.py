@@ -0,0 +1,551 @@
+import os
+import re
+import sys
+import json
+import tempfile
+import subprocess
+from collections import namedtuple, defaultdict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from colorama import Fore
+from timing import run_usage
+from stat_descriptions import stat_descriptions
+
+OPT_PATH = './../../dev/llvm-project/build/bin/opt'
+
+# Extra flags passed to opt for every optimization level we study
+# PLAIN runs opt without any -O flag
+OPT_LEVELS = {
+    'PLAIN': [],
+    'O1': ['-O1'],
+    'O2': ['-O2'],
+    'O3': ['-O3'],
+    'Os': ['-Os'],
+    'Oz': ['-Oz'],
+}
+
+# How the stats are collected from opt
+# text: the human readable -stats report on stderr, written to stats_N.txt
+# json: the -stats-json report, decoded into {stat: count} records with the
+#       keys of the text report and written to stats_N.jsonl
+STATS_MODES = ['text', 'json']
+
+# -time-trace files of the runs with time_trace set, one per task
+TRACE_DIRECTORY = './traces'
+
+# Levels can be restricted with a comma separated list, eg. LEVELS=PLAIN,O2,O3
+def selected_levels(spec=None):
+    if spec is None:
+        spec = os.environ.get('LEVELS')
+    if not spec:
+        return list(OPT_LEVELS)
+
+    requested = [level.strip() for level in spec.split(',') if level.strip()]
+    for level in requested:
+        if level not in OPT_LEVELS:
+            print(Fore.RED + f"Unknown optimization level {level}, expected one of {', '.join(OPT_LEVELS)}" + Fore.RESET)
+            sys.exit(1)
+
+    # Always keep the PLAIN, O1, O2, ... order so analyze.py sees the same layout
+    return [level for level in OPT_LEVELS if level in requested]
+
+# The stats mode is taken from STATS_MODE, text by default
+def selected_stats_mode(mode=None):
+    if mode is None:
+        mode = os.environ.get('STATS_MODE', 'text')
+
+    if mode not in STATS_MODES:
+        print(Fore.RED + f"Unknown stats mode {mode}, expected one of {', '.join(STATS_MODES)}" + Fore.RESET)
+        sys.exit(1)
+
+    return mode
+
+# One opt invocation, ie. a single knob value on a single bitcode file
+# at a single optimization level
+SweepTask = namedtuple('SweepTask', ['knob_name', 'val', 'file_index', 'level'])
+
+# The knob flags of a task
+# A batched task sets several knobs at once, its knob_name and val are tuples
+def knob_flags(task):
+    if isinstance(task.knob_name, tuple):
+        return [f'-{knob_name}={val}' for knob_name, val in zip(task.knob_name, task.val)]
+    return [f'-{task.knob_name}={task.val}']
+
+
+# Number of tasks queued per worker, keeps the pool busy without
+# building millions of futures up front
+TASKS_PER_WORKER = 4
+
+
+def bitcode_path(file_index):
+    return f'./bitcode/test_{(file_index + 1)}.bc'
+
+
+# opt exited with a non-zero status, eg. it crashed, ran out of memory or was
+# interrupted. output is what the run gave anyway, it is never cached.
+class OptRunError(Exception):
+    def __init__(self, command_vector, returncode, output):
+        super().__init__(f"{' '.join(command_vector)} exited with status {returncode}")
+        self.command_vector = command_vector
+        self.returncode = returncode
+        self.output = output
+
+    # Raised in the llvmlite worker processes, so it must survive pickling
+    def __reduce__(self):
+        return (OptRunError, (self.command_vector, self.returncode, self.output))
+
+
+# -stats-json names a stat "<DEBUG_TYPE>.<Variable>", we turn it into the
+# "<description> (<DEBUG_TYPE>)" key of the text report with the descriptions
+# of stat_descriptions.py. A stat without a description keeps its variable name.
+def parse_stats_json(stats_json, descriptions):
+    record = {}
+    for name, count in json.loads(stats_json).items():
+        # Timers are reported next to the stats, we only keep the counters
+        if not isinstance(count, int):
+            continue
+        component, _, variable = name.rpartition('.')
+        record[f"{descriptions.get(name, variable)} ({component})"] = count
+
+    return record
+
+
+# A line of the -stats text report, "<count> <component> - <description>"
+line_pattern = re.compile(r'^\s*(\d+)\s+(\S+)\s+-\s+(.*)$')
+
+
+# Decodes the output of a single task into a {stat: count} record
+def output_record(output, stats_mode='text'):
+    if stats_mode == 'json':
+        return json.loads(output)
+
+    record = {}
+    for line in output.splitlines():
+        match = line_pattern.match(line)
+        if match:
+            key = f"{match.group(3)} ({match.group(2)})"
+            record[key] = record.get(key, 0) + int(match.group(1))
+
+    return record
+
+
+# Runs opt once with -stats-json and returns the decoded record as JSON and the exit status
+# The report goes to its own file through -info-output-file so stderr is not parsed at all
+def run_opt_json(command_vector, descriptions):
+    fd, info_path = tempfile.mkstemp(suffix='.json')
+    os.close(fd)
+    try:
+        result = subprocess.run(command_vector + [f'-info-output-file={info_path}'], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+        with open(info_path, 'r') as file:
+            stats_json = file.read()
+    finally:
+        os.unlink(info_path)
+
+    if not stats_json.strip():
+        return json.dumps({}), result.returncode
+
+    return json.dumps(parse_stats_json(stats_json, descriptions)), result.returncode
+
+
+# Runs opt once and returns its stderr, the usage of the opt process and its exit status
+# wall, user and sys time in seconds, max RSS in KB, taken from os.wait4
+def run_opt_usage(command_vector):
+    return run_usage(command_vector, stderr=subprocess.PIPE)
+
+
+# Banner in front of every report opt prints on exit, eg. "... Statistics Collected ..."
+# for -stats and "... Pass execution timing report ..." for -time-passes
+report_banner_pattern = re.compile(r'^===-+===\n(.*)\n===-+===\n', re.MULTILINE)
+
+# Splits the output of opt into its reports, returns [(title, start, end)]
+def report_sections(output):
+    matches = list(report_banner_pattern.finditer(output))
+    sections = []
+    for idx, match in enumerate(matches):
+        end = matches[idx + 1].start() if idx + 1 < len(matches) else len(output)
+        sections.append((match.group(1).strip(' .'), match.start(), end))
+
+    return sections
+
+
+# The lines of the -stats report in the output of opt, without its banner
+# Anything opt prints before or after the report, eg. warnings, is left out
+def stats_report(output):
+    for title, start, end in report_sections(output):
+        if title == 'Statistics Collected':
+            return report_banner_pattern.sub('', output[start:end], count=1).lstrip('\n')
+
+    return ''
+
+
+# Runs opt once and returns the -stats report of stderr and the exit status of opt
+def run_opt(command_vector):
+    with subprocess.Popen(command_vector, stdout=subprocess.PIPE, stderr=subprocess.PIPE) as opt_process:
+        _, stderr_data = opt_process.communicate()
+
+    return stats_report(stderr_data.decode('utf-8', errors='replace')), opt_process.returncode
+
+
+# "---User Time---   --System Time--   ...  --- Name ---", the columns of a timing report
+timer_column_pattern = re.compile(r'-{2,}\s*([A-Za-z+ ]+?)\s*-{2,}')
+# "0.0012 ( 25.0%)", a time in seconds and its share of the total
+timer_time_pattern = re.compile(r'(\d+\.\d+)\s+\(\s*[\d.]+%\)')
+
+# Per pass times of a -time-passes report, keyed "<metric> time us (<pass>)"
+# Times are integer microseconds so they fit the stats table
+def parse_timing_report(report, description_prefix=''):
+    record = {}
+    columns = None
+
+    for line in report.splitlines():
+        if columns is None:
+            if 'Name' in line and '---' in line:
+                columns = [column for column in timer_column_pattern.findall(line) if column != 'Name']
+            continue
+
+        times = list(timer_time_pattern.finditer(line))
+        if not times:
+            continue
+        name = line[times[-1].end():].strip()
+        # A -track-memory column comes before the name
+        if 'Mem' in columns:
+            name = name.split(None, 1)[-1]
+        if name == 'Total':
+            continue
+
+        for column, time_match in zip(columns, times):
+            if column == 'Wall Time':
+                record[f"{description_prefix}wall time us ({name})"] = round(float(time_match.group(1)) * 1e6)
+            elif column == 'User Time':
+                record[f"{description_prefix}user time us ({name})"] = round(float(time_match.group(1)) * 1e6)
+
+    return record
+
+
+# With -stats-json the timers are also in the JSON report,
+# as "time.<group>.<timer>.<wall|user|sys|mem>"
+def parse_timer_json(stats_json):
+    record = {}
+    for name, value in json.loads(stats_json).items():
+        if not name.startswith('time.') or isinstance(value, int):
+            continue
+        group, _, timer = name[len('time.'):].partition('.')
+        timer_name, _, metric = timer.rpartition('.')
+        if metric not in ('wall', 'user'):
+            continue
+        description_prefix = 'analysis ' if group == 'analysis' else ''
+        record[f"{description_prefix}{metric} time us ({timer_name})"] = round(value * 1e6)
+
+    return record
+
+
+# The timing record of one opt run, the -time-passes reports and the usage of the process
+def timing_record(reports, usage):
+    record = {
+        'wall time us (opt)': round(usage['wall'] * 1e6),
+        'user time us (opt)': round(usage['user'] * 1e6),
+        'max RSS KB (opt)': usage['max_rss'],
+    }
+    for title, report in reports:
+        if 'timing report' in title:
+            record.update(parse_timing_report(report, 'analysis ' if title.startswith('Analysis') else ''))
+
+    return record
+
+
+# Runs opt once with -time-passes, returns the -stats report the way run_opt
+# does, the timing record and the exit status
+def run_opt_timed(command_vector):
+    stderr_data, usage, returncode = run_opt_usage(command_vector)
+    stderr_text = stderr_data.decode('utf-8', errors='replace')
+
+    reports = [(title, stderr_text[start:end]) for title, start, end in report_sections(stderr_text) if title != 'Statistics Collected']
+
+    return stats_report(stderr_text), timing_record(reports, usage), returncode
+
+
+# Runs opt once with -stats-json and -time-passes, returns the decoded record as JSON,
+# the timing record and the exit status. The text timing reports land in the same
+# file as the JSON report.
+def run_opt_json_timed(command_vector, descriptions):
+    fd, info_path = tempfile.mkstemp(suffix='.json')
+    os.close(fd)
+    try:
+        _, usage, returncode = run_opt_usage(command_vector + [f'-info-output-file={info_path}'])
+
+        with open(info_path, 'r') as file:
+            info_output = file.read()
+    finally:
+        os.unlink(info_path)
+
+    json_match = re.search(r'^\{$.*?^\}$', info_output, re.MULTILINE | re.DOTALL)
+    stats_json = json_match.group(0) if json_match else '{}'
+    text_output = info_output[:json_match.start()] + info_output[json_match.end():] if json_match else info_output
+
+    reports = [(title, text_output[start:end]) for title, start, end in report_sections(text_output)]
+    timings = timing_record(reports, usage)
+    timings.update(parse_timer_json(stats_json))
+
+    return json.dumps(parse_stats_json(stats_json, descriptions)), timings, returncode
+
+
+# Output of a run with time_passes, {"stats": <stats output>, "timings": {<key>: <int>}}
+def split_timed_output(output):
+    timed_output = json.loads(output)
+    return timed_output['stats'], timed_output['timings']
+
+
+# Spawns one opt process per task
+# With time_passes opt also runs with -time-passes and the output of a run is the
+# {"stats": ..., "timings": ...} JSON of split_timed_output. With time_trace every
+# run that is not read from a cache also leaves a -time-trace file in ./traces.
+class SubprocessBackend:
+    def __init__(self, opt_path=OPT_PATH, stats_mode=None, time_passes=False, time_trace=False):
+        self.opt_path = opt_path
+        self.stats_mode = selected_stats_mode(stats_mode)
+        self.time_passes = time_passes
+        self.time_trace = time_trace
+        # json records are keyed like the text report, by the descriptions of the stats
+        self.stat_descriptions = stat_descriptions(opt_path) if self.stats_mode == 'json' else None
+        # What the output of a run holds, part of the result store key
+        # json+descriptions, since json runs stored before the stats had
+        # descriptions have other keys, and text+decoded, since text runs
+        # used to be stored as the escaped repr of stderr
+        self.output_kind = ('json+descriptions' if self.stats_mode == 'json' else 'text+decoded') + ('+time-passes' if time_passes else '')
+
+    # Everything on the command line except opt and the bitcode file
+    # The default value of a knob runs without the knob flag
+    def flags(self, task, with_knob=True):
+        flags = knob_flags(task) if with_knob else []
+        flags += OPT_LEVELS[task.level] + ['-stats']
+        if self.stats_mode == 'json':
+            flags.append('-stats-json')
+        if self.time_passes:
+            flags.append('-time-passes')
+        return flags
+
+    def trace_path(self, task, with_knob=True):
+        run_name = '+'.join(flag[1:].replace('=', '_') for flag in knob_flags(task)) if with_knob else 'baseline'
+        return os.path.join(TRACE_DIRECTORY, run_name, f'{task.level}_{task.file_index + 1}.json')
+
+    def command_vector(self, task, with_knob=True):
+        command_vector = [self.opt_path] + self.flags(task, with_knob) + [bitcode_path(task.file_index)]
+        if self.time_trace:
+            command_vector += ['-time-trace', f'-time-trace-file={self.trace_path(task, with_knob)}']
+        return command_vector
+
+    # Raises OptRunError when opt does not exit cleanly
+    def run(self, task, with_knob=True):
+        if self.time_trace:
+            os.makedirs(os.path.dirname(self.trace_path(task, with_knob)), exist_ok=True)
+
+        command_vector = self.command_vector(task, with_knob)
+        if self.time_passes:
+            if self.stats_mode == 'json':
+                stats_output, timings, returncode = run_opt_json_timed(command_vector, self.stat_descriptions)
+            else:
+                stats_output, timings, returncode = run_opt_timed(command_vector)
+            output = json.dumps({'stats': stats_output, 'timings': timings})
+        elif self.stats_mode == 'json':
+            output, returncode = run_opt_json(command_vector, self.stat_descriptions)
+        else:
+            output, returncode = run_opt(command_vector)
+
+        if returncode != 0:
+            raise OptRunError(command_vector, returncode, output)
+        return output
+
+
+def default_num_workers():
+    return os.cpu_count() or 1
+
+
+def baseline_key(task, backend, baseline_cache):
+    return baseline_cache.key(bitcode_path(task.file_index), task.level, backend.flags(task, with_knob=False), backend.output_kind)
+
+
+def result_key(task, backend, result_store):
+    return result_store.key(task.knob_name, task.val, task.level, bitcode_path(task.file_index), backend.output_kind)
+
+
+# Runs a task on the backend, returns its output and the OptRunError of a failed run
+# The output of a failed run is still returned so the sweep goes on, but it must
+# not be cached as a result, it is only recorded as a failure
+def run_checked(backend, task, with_knob=True):
+    try:
+        return backend.run(task, with_knob), None
+    except OptRunError as error:
+        print(Fore.RED + str(error) + Fore.RESET)
+        return error.output, error
+
+
+# Stores the output of a finished run, or records it as failed
+def store_result(result_store, key, output, error):
+    if error is None:
+        result_store.put(key, output)
+    else:
+        result_store.put_failure(key, error.returncode, output)
+
+
+# A failed baseline is not cached, a resumed sweep runs it again
+def run_baseline(task, backend, baseline_cache, key):
+    output, error = run_checked(backend, task, with_knob=False)
+    if error is None:
+        baseline_cache.put(key, output)
+    return output
+
+
+# Runs a single task, the default value of a knob is read from the
+# baseline cache and anything already run from the result store
+def run_task(task, backend, default=None, baseline_cache=None, result_store=None):
+    if baseline_cache is not None and task.val == default:
+        key = baseline_key(task, backend, baseline_cache)
+        output = baseline_cache.get(key)
+        if output is None:
+            output = run_baseline(task, backend, baseline_cache, key)
+        return output
+
+    if result_store is None:
+        return run_checked(backend, task)[0]
+
+    key = result_key(task, backend, result_store)
+    output = result_store.get(key)
+    if output is None:
+        output, error = run_checked(backend, task)
+        store_result(result_store, key, output, error)
+
+    return output
+
+
+# Bounded scheduler for the sweep
+# Runs every task on a fixed number of workers, each worker drives a single
+# opt process at a time so at most num_workers opt processes run at once.
+# Tasks at the default value of their knob (given in defaults) are answered
+# from the baseline cache, and each missing baseline is only run once.
+# Tasks found in the result store, including the failed ones, are not run again,
+# new outputs are added to it.
+# Yields (task, output) in completion order.
+def run_sweep(tasks, backend, num_workers=None, defaults=None, baseline_cache=None, result_store=None):
+    if num_workers is None:
+        num_workers = default_num_workers()
+    if defaults is None:
+        defaults = {}
+
+    max_in_flight = num_workers * TASKS_PER_WORKER
+    tasks = iter(tasks)
+    # future -> tasks waiting on it
+    in_flight = {}
+    # baseline key -> future computing it, and back
+    baseline_futures = {}
+    baseline_keys = {}
+
+    with ThreadPoolExecutor(max_workers=num_workers) as executor:
+        while True:
+            for task in tasks:
+                if baseline_cache is not None and task.knob_name in defaults and task.val == defaults[task.knob_name]:
+                    key = baseline_key(task, backend, baseline_cache)
+
+                    output = baseline_cache.get(key)
+                    if output is not None:
+                        yield task, output
+                        continue
+
+                    if key in baseline_futures:
+                        in_flight[baseline_futures[key]].append(task)
+                        continue
+
+                    future = executor.submit(run_baseline, task, backend, baseline_cache, key)
+                    baseline_futures[key] = future
+                    baseline_keys[future] = key
+                else:
+                    if result_store is not None:
+                        output = result_store.get(result_key(task, backend, result_store))
+                        if output is not None:
+                            yield task, output
+                            continue
+
+                    future = executor.submit(run_checked, backend, task)
+
+                in_flight[future] = [task]
+                if len(in_flight) >= max_in_flight:
+                    break
+
+            if not in_flight:
+                break
+
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future in baseline_keys:
+                    del baseline_futures[baseline_keys.pop(future)]
+                    for task in in_flight.pop(future):
+                        yield task, future.result()
+                    continue
+
+                task, = in_flight.pop(future)
+                output, error = future.result()
+                if result_store is not None:
+                    store_result(result_store, result_key(task, backend, result_store), output, error)
+                yield task, output
+
+
+# Puts the per level outputs of one bitcode file back together
+# text: "PLAIN STATS> ... O1 STATS> ..." in the order of the levels
+# json: {"PLAIN": {...}, "O1": {...}} in the order of the levels
+def combine_level_outputs(outputs, levels, stats_mode='text'):
+    if stats_mode == 'json':
+        return json.dumps({level: json.loads(outputs[level]) for level in levels})
+
+    output_string = ""
+    for level in levels:
+        output_string += f"{level} STATS> \n"
+        output_string += outputs[level]
+
+    return output_string
+
+
+def stats_file_name(index, stats_mode='text'):
+    if stats_mode == 'json':
+        return f'stats_{index}.jsonl'
+    return f'stats_{index}.txt'
+
+
+# The entry of one bitcode file in a stats file
+# text: a "STATS FOR FILE" banner followed by the combined output
+# json: one line {"file": i, "stats": {level: {stat: count}}}
+def format_stats_block(file_index, output_string, stats_mode='text'):
+    if stats_mode == 'json':
+        return json.dumps({'file': file_index, 'stats': json.loads(output_string)}) + "\n"
+
+    return f"====================================  STATS FOR FILE : {file_index} ====================================\n" + output_string
+
+
+# Level fan-out for a single (knob, value, file)
+# Runs all the levels at the same time and returns the combined output
+def run_levels(knob_name, val, file_index, backend, levels=None, default=None, baseline_cache=None, result_store=None):
+    if levels is None:
+        levels = selected_levels()
+
+    tasks = [SweepTask(knob_name, val, file_index, level) for level in levels]
+    with ThreadPoolExecutor(max_workers=len(tasks)) as executor:
+        outputs = executor.map(lambda task: run_task(task, backend, default, baseline_cache, result_store), tasks)
+        outputs = dict(zip(levels, outputs))
+
+    # The timings are not part of the stats files
+    if backend.time_passes:
+        outputs = {level: split_timed_output(output)[0] for level, output in outputs.items()}
+
+    return combine_level_outputs(outputs, levels, backend.stats_mode)
+
+
+# Level fan-in for the sweep
+# Takes the (task, output) pairs of run_sweep and yields
+# (knob_name, val, file_index, output_string) once every level of a file is done
+def gather_levels(results, levels, stats_mode='text'):
+    pending_outputs = defaultdict(dict)
+
+    for task, output in results:
+        key = (task.knob_name, task.val, task.file_index)
+        pending_outputs[key][task.level] = output
+
+        if len(pending_outputs[key]) == len(levels):
+            yield task.knob_name, task.val, task.file_index, combine_level_outputs(pending_outputs.pop(key), levels, stats_mode)
@@ -0,0 +1,251 @@
+import os
+import sys
+import time
+import math
+import random
+import statistics
+import shutil
+import subprocess
+from queue import Queue
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from colorama import Fore
+
+# Timing backends for the runtime studies
+# rusage: the wall time of the child and its user time, system time and max RSS
+#         from os.wait4, no root and no extra process needed
+# perf:   the same usage, plus the perf stat counters of the child. Needs perf,
+#         and root unless perf_event_paranoid allows it (PERF_COMMAND="sudo perf")
+TIMERS = ['rusage', 'perf']
+
+# Events perf stat counts for every sample
+PERF_EVENTS = ['task-clock', 'cycles', 'instructions']
+
+
+# Runs a command and returns its stderr (with stderr=subprocess.PIPE), its usage
+# and its exit status. The usage holds the wall, user and sys times in seconds
+# and the max RSS in KB
+# With cpu set the command only runs on that CPU. The affinity of a thread is
+# inherited by the processes it starts, so the calling thread is pinned while
+# the command is started and unpinned right after.
+def run_usage(command_vector, stderr=subprocess.DEVNULL, cpu=None):
+    if cpu is not None:
+        thread_cpus = os.sched_getaffinity(0)
+        os.sched_setaffinity(0, {cpu})
+
+    start = time.perf_counter()
+    try:
+        process = subprocess.Popen(command_vector, stdout=subprocess.DEVNULL, stderr=stderr)
+    finally:
+        if cpu is not None:
+            os.sched_setaffinity(0, thread_cpus)
+
+    with process:
+        stderr_data = process.stderr.read() if stderr == subprocess.PIPE else None
+        _, status, rusage = os.wait4(process.pid, 0)
+        # Tell Popen the child is already reaped
+        process.returncode = os.waitstatus_to_exitcode(status)
+    wall_time = time.perf_counter() - start
+
+    return stderr_data, {'wall': wall_time, 'user': rusage.ru_utime, 'sys': rusage.ru_stime, 'max_rss': rusage.ru_maxrss}, process.returncode
+
+
+class RusageTimer:
+    name = 'rusage'
+
+    def measure(self, command_vector, cpu=None):
+        _, usage, _ = run_usage(command_vector, cpu=cpu)
+        return usage
+
+
+# "<value>,<unit>,<event>,..." lines of perf stat -x,
+def parse_perf_csv(perf_output, events=PERF_EVENTS):
+    counters = {}
+    for line in perf_output.splitlines():
+        fields = line.split(',')
+        if len(fields) < 3 or fields[2] not in events:
+            continue
+        try:
+            counters[fields[2]] = float(fields[0])
+        except ValueError:
+            # <not counted> or <not supported>
+            continue
+
+    return counters
+
+
+class PerfTimer:
+    name = 'perf'
+
+    def __init__(self, perf_command=None, events=PERF_EVENTS):
+        if perf_command is None:
+            perf_command = os.environ.get('PERF_COMMAND', 'perf').split()
+        self.perf_command = perf_command
+        self.events = events
+
+    def available(self):
+        return shutil.which(self.perf_command[-1]) is not None
+
+    # The usage is the one of perf, which waits for the command, and so includes it
+    def measure(self, command_vector, cpu=None):
+        perf_command_vector = self.perf_command + ['stat', '-x', ',', '-e', ','.join(self.events), '--'] + command_vector
+        stderr_data, usage, _ = run_usage(perf_command_vector, stderr=subprocess.PIPE, cpu=cpu)
+        usage.update(parse_perf_csv(stderr_data.decode('utf-8', 'replace'), self.events))
+        return usage
+
+
+# The timer is taken from TIMER, rusage by default
+def selected_timer(name=None):
+    if name is None:
+        name = os.environ.get('TIMER', 'rusage')
+
+    if name not in TIMERS:
+        print(Fore.RED + f"Unknown timer {name}, expected one of {', '.join(TIMERS)}" + Fore.RESET)
+        sys.exit(1)
+
+    if name == 'perf':
+        timer = PerfTimer()
+        if not timer.available():
+            print(Fore.RED + f"{timer.perf_command[-1]} not found, use TIMER=rusage" + Fore.RESET)
+            sys.exit(1)
+        return timer
+
+    return RusageTimer()
+
+
+# Sampling settings, see sample_runtime
+WARMUP_RUNS = 1
+MIN_REPETITIONS = 5
+MAX_REPETITIONS = 30
+# Stop once the 95% confidence interval of the mean is within this share of it
+TARGET_RELATIVE_CI = 0.02
+# Samples further than this many scaled MADs from the median are outliers
+OUTLIER_MADS = 3.5
+
+# Two sided 95% quantiles of Student's t for n - 1 degrees of freedom, 1.96 past the table
+T_95 = [12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228, 2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086, 2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042]
+
+
+# CPUs given with PIN_CPUS=2,3 or 4-7 or else the isolcpus= ones of the kernel
+def pinned_cpus():
+    spec = os.environ.get('PIN_CPUS')
+    if not spec:
+        try:
+            with open('/sys/devices/system/cpu/isolated', 'r') as file:
+                spec = file.read().strip()
+        except FileNotFoundError:
+            spec = ''
+
+    cpus = set()
+    for part in spec.split(','):
+        if '-' in part:
+            first, last = part.split('-')
+            cpus.update(range(int(first), int(last) + 1))
+        elif part.strip():
+            cpus.add(int(part))
+
+    return sorted(cpus)
+
+
+# One CPU of every physical core, so that two measurements never share a core
+# through SMT
+def physical_core_cpus(cpus):
+    cores = {}
+    for cpu in sorted(cpus):
+        try:
+            with open(f'/sys/devices/system/cpu/cpu{cpu}/topology/thread_siblings_list', 'r') as file:
+                core = file.read().strip()
+        except FileNotFoundError:
+            core = str(cpu)
+        cores.setdefault(core, cpu)
+
+    return sorted(cores.values())
+
+
+# CPUs for parallel measurements, the pinned ones if there are any, otherwise
+# one CPU per physical core we may run on, except the first core which is left
+# to the system and to this script
+def measurement_cpus():
+    cpus = pinned_cpus()
+    if cpus:
+        return cpus
+
+    cpus = physical_core_cpus(os.sched_getaffinity(0))
+    return cpus[1:] if len(cpus) > 1 else cpus
+
+
+# Median, MAD and the mean with its 95% confidence interval of the samples that
+# are not outliers, plus all the samples
+def summarize_samples(samples):
+    median = statistics.median(samples)
+    mad = statistics.median([abs(sample - median) for sample in samples])
+    # 1.4826 * MAD estimates the standard deviation of normal samples
+    limit = OUTLIER_MADS * 1.4826 * mad
+    kept = [sample for sample in samples if abs(sample - median) <= limit] if mad > 0 else list(samples)
+
+    mean = statistics.fmean(kept)
+    if len(kept) > 1:
+        t = T_95[len(kept) - 2] if len(kept) - 2 < len(T_95) else 1.96
+        ci = t * statistics.stdev(kept) / math.sqrt(len(kept))
+    else:
+        ci = math.inf
+
+    return {
+        'median': median,
+        'mad': mad,
+        'mean': mean,
+        'ci': ci,
+        'n': len(samples),
+        'outliers': len(samples) - len(kept),
+        'samples': samples,
+    }
+
+
+# Runs a command until its wall time is known well enough
+# The warmup runs are thrown away, then it runs at least min_repetitions times and
+# stops once the confidence interval of the mean is within target_relative_ci of
+# it, or after max_repetitions. Every run is pinned to cpu.
+def sample_runtime(timer, command_vector, cpu=None, metric='wall', warmup_runs=WARMUP_RUNS, min_repetitions=MIN_REPETITIONS, max_repetitions=MAX_REPETITIONS, target_relative_ci=TARGET_RELATIVE_CI):
+    for _ in range(warmup_runs):
+        timer.measure(command_vector, cpu)
+
+    usages = []
+    while len(usages) < max_repetitions:
+        usages.append(timer.measure(command_vector, cpu))
+        if len(usages) < min_repetitions:
+            continue
+        summary = summarize_samples([usage[metric] for usage in usages])
+        if summary['ci'] <= target_relative_ci * summary['mean']:
+            break
+    else:
+        summary = summarize_samples([usage[metric] for usage in usages])
+
+    # Median of every other metric of the timer, eg. user time or max RSS
+    summary['usage'] = {name: statistics.median(usage[name] for usage in usages) for name in usages[0]}
+    return summary
+
+
+# Measurement scheduler
+# jobs: [(key, command_vector)], every job is sampled with sample_runtime on a
+# CPU of its own, with as many jobs at once as there are CPUs. The jobs are run in
+# a random order so that a drift of the machine over time (heat, frequency) is
+# spread over all the configurations instead of biasing the ones that run last.
+# Yields (key, summary) in completion order.
+def run_measurements(jobs, timer, cpus, seed=None):
+    jobs = list(jobs)
+    random.Random(seed).shuffle(jobs)
+
+    free_cpus = Queue()
+    for cpu in cpus:
+        free_cpus.put(cpu)
+
+    def measure(command_vector):
+        cpu = free_cpus.get()
+        try:
+            return sample_runtime(timer, command_vector, cpu)
+        finally:
+            free_cpus.put(cpu)
+
+    with ThreadPoolExecutor(max_workers=len(cpus)) as executor:
+        futures = {executor.submit(measure, command_vector): key for key, command_vector in jobs}
+        for future in as_completed(futures):
+            yield futures[future], future.result()